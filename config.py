@@ -16,7 +16,7 @@
 """
 
 import logging
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 from nonebot import get_driver
 
@@ -28,31 +28,124 @@ class PluginConfig(BaseSettings):
     openai_api_key: str = ""
     openai_base_url: str = "https://api.openai.com/v1"
     openai_model_name: str = "gpt-3.5-turbo"
+    openai_max_prompt_tokens: int = 0  # 提示词token预算（估算值），0表示仅按条数截取历史
+    openai_max_concurrency: int = 0  # 最大在途请求数，0表示不限制
+    openai_rpm: int = 0  # 每分钟请求数上限，0表示不限制
+    openai_tpm: int = 0  # 每分钟提示词token数上限（估算值），0表示不限制
     
     # DeepSeek配置
     deepseek_api_key: str = ""
     deepseek_base_url: str = "https://api.deepseek.com/v1"
     deepseek_model_name: str = "deepseek-chat"
+    deepseek_max_prompt_tokens: int = 0  # 提示词token预算（估算值），0表示仅按条数截取历史
+    deepseek_max_concurrency: int = 0  # 最大在途请求数，0表示不限制
+    deepseek_rpm: int = 0  # 每分钟请求数上限，0表示不限制
+    deepseek_tpm: int = 0  # 每分钟提示词token数上限（估算值），0表示不限制
     
     # 豆包配置
     doubao_api_key: str = ""
     doubao_base_url: str = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
     doubao_model_name: str = "doubao-1-5-lite-32k-250115"
+    doubao_max_prompt_tokens: int = 0  # 提示词token预算（估算值），0表示仅按条数截取历史
+    doubao_max_concurrency: int = 0  # 最大在途请求数，0表示不限制
+    doubao_rpm: int = 0  # 每分钟请求数上限，0表示不限制
+    doubao_tpm: int = 0  # 每分钟提示词token数上限（估算值），0表示不限制
+
+    # HTTP连接池配置（每个服务商一个长连接池）
+    http_pool_size: int = 100  # 每个服务商的最大连接数
+    http_keepalive_timeout: float = 60  # 空闲连接保活时间（秒）
+    http_dns_cache_ttl: int = 300  # DNS解析缓存时间（秒，原生HTTP接口）
+    http2_enabled: bool = True  # 安装了 h2 时为OpenAI兼容接口启用HTTP/2
+    provider_warmup: bool = False  # 启动时预先建立到各服务商的连接
+    provider_warmup_connections: int = 2  # 每个服务商预热的连接数
+    provider_warmup_timeout: float = 5  # 单个预热请求的超时时间（秒）
+    provider_keep_warm_interval: float = 0  # 空闲保温检查间隔（秒），服务商空闲超过该时长时重新预热，0表示关闭
+
+    # 公平调度与服务商排队配置
+    scheduler_max_concurrency: int = 0  # 所有模型同时进行的生成数上限，超出后按用户公平排队（管理员优先），0表示不限制
+    scheduler_quantum: int = 500  # 公平排队时每个用户每轮获得的额度（估算token数）
+    provider_queue_size: int = 100  # 每个服务商超出限制后最多排队的请求数，超出时直接回复繁忙
+    provider_queue_timeout: float = 10  # 排队最长等待时间（秒）
+    provider_busy_reply: str = "现在找我聊天的人有点多，请稍后再试"
+
+    # 对冲请求配置
+    hedge_enabled: bool = False  # 是否开启对冲请求（仅非流式回复）
+    hedge_fallback_model: str = "deepseek"  # 对冲请求使用的模型
+    hedge_percentile: float = 95  # 原请求超过近期耗时的该分位数仍未返回时发出对冲请求
+    hedge_min_delay: float = 1.0  # 发出对冲请求前的最短等待时间（秒）
+    hedge_latency_window: int = 200  # 每个模型用于计算耗时分位数的最近请求数
+    hedge_min_samples: int = 20  # 样本数达到该值后才会对冲
+
+    # 熔断配置
+    breaker_enabled: bool = False  # 是否开启熔断（关闭时仍统计各模型的健康状况）
+    breaker_window: int = 20  # 统计最近多少次请求
+    breaker_min_calls: int = 10  # 最近请求数达到该值后才会熔断
+    breaker_error_rate: float = 0.5  # 错误率达到该值时熔断
+    breaker_slow_call_seconds: float = 30  # 耗时超过该值（秒）的请求记为慢请求（流式回复按首个增量计）
+    breaker_slow_call_rate: float = 0.8  # 慢请求比例达到该值时熔断
+    breaker_open_seconds: float = 30  # 熔断后多久放行探测请求（秒）
+    breaker_half_open_probes: int = 1  # 探测阶段同时放行的请求数，全部成功后恢复
+    breaker_fallback_model: str = ""  # 熔断期间改用的模型，为空时直接回复 breaker_open_reply
+    breaker_open_reply: str = "服务暂时不可用，请稍后重试"
+
+    # 请求时限与重试配置
+    request_timeout: float = 60  # 单条消息生成回复的总时限（秒），0表示不限制；流式回复中为首个增量的时限及相邻增量的最大间隔
+    request_db_timeout: float = 5  # 保存消息、读取历史并构建提示词各阶段的时限（秒）
+    request_timeout_reply: str = "回复超时了，请稍后再试"
+    provider_attempt_timeout: float = 0  # 单次模型调用的时限（秒），0表示使用剩余的全部时间
+    provider_max_retries: int = 1  # 模型调用失败后的最多重试次数（仅在剩余时间足够时重试，不含熔断与繁忙）
+    provider_retry_backoff: float = 0.5  # 重试退避基数（秒），第n次重试前随机等待 0 ~ 基数*2^(n-1) 秒
 
     # 通用配置
-    default_model: str = "doubao"
+    default_model: str = "doubao"  # 默认模型，设为 "auto" 时按实时耗时、错误率与成本自动选择
+    model_auto_candidates: List[str] = []  # 自动选择的候选模型，为空时为所有已配置的模型
+    model_cost_weights: Dict[str, float] = {}  # 各模型的相对成本（默认1），成本越高越少被自动选择
+    model_latency_ewma_alpha: float = 0.2  # 耗时指数滑动平均的平滑系数，越大越偏向最近的请求
+    model_error_penalty: float = 10  # 错误率惩罚系数：得分 = 平均耗时 * (1 + 系数 * 错误率) * 成本
+    model_explore_rate: float = 0.05  # 自动选择时随机尝试其他候选模型的概率（用于更新耗时统计）
     max_history_length: int = 20  # 最大对话历史长度
+    conversation_cache_size: int = 50  # 每个用户在内存中缓存的最近消息条数
+    conversation_cache_max_users: int = 1000  # 内存中最多缓存多少个用户的对话（LRU淘汰）
+    conversation_cache_max_bytes: int = 32 * 1024 * 1024  # 对话缓存的内存预算（字节，估算值）
     temperature: float = 0.7  # 模型温度参数
+    message_debounce_seconds: float = 0  # 连续消息合并窗口（秒），用户停顿超过该时长才统一回复一次，0表示关闭
+    inflight_policy: str = "cancel"  # 用户在回复生成期间发送新消息时的处理方式：cancel（取消旧生成）/ drop（旧生成完成后丢弃）/ queue（排队依次回复）
+    background_workers: int = 2  # 执行后台事件处理器（日志等）的工作协程数
+    background_queue_size: int = 1000  # 后台队列容量，0表示不限制
+    background_overflow: str = "drop"  # 后台队列满时的处理方式：drop（丢弃）/ block（等待空位，拖慢分发）/ spill（暂存到溢出缓冲区）
+    background_spill_size: int = 10000  # spill 策略下溢出缓冲区的大小，0表示不限制
+    background_drain_timeout: float = 10  # 关闭时等待后台任务执行完毕的最长时间（秒）
+    metrics_enabled: bool = True  # 是否统计各处理阶段、事件处理器与模型调用的耗时
+    metrics_window: int = 1000  # 每项耗时统计保留的最近样本数（用于计算分位数）
+    metrics_export_path: str = ""  # 定期将指标以 Prometheus 文本格式写入该文件，为空表示不写入
+    metrics_export_interval: float = 60  # 写入指标文件的间隔（秒）
+    metrics_http_route: str = ""  # 以 Prometheus 文本格式提供指标的 HTTP 路径（如 "/warmai/metrics"，需使用 ASGI 驱动器），为空表示不提供
     
     personality_default: str = "你叫落叶，是一位抽象玩梗的网友"
 
+    # 流式回复配置
+    stream_reply: bool = False  # 是否流式生成并按句/段分条发送
+    stream_reply_split: str = "sentence"  # 分条方式：sentence（按句）/ paragraph（按段）
+    stream_reply_min_chars: int = 8  # 每条消息的最少字符数，过短的句子与后续内容合并发送
+
     # 数据库配置
     db_path: str = "./data/warmai/data.db"
+    db_wal_mode: bool = True  # 启用WAL日志模式，读写互不阻塞
+    db_synchronous: str = "NORMAL"  # PRAGMA synchronous：OFF/NORMAL/FULL/EXTRA（WAL下NORMAL仅在检查点时fsync）
+    db_write_batch_size: int = 64  # 延迟写入队列攒够多少行立即提交
+    db_write_flush_interval_ms: int = 50  # 延迟写入队列最长等待多少毫秒提交
 
+    # 所有用户共用的对话表：user_id 为会话所属用户，sender 为实际发送者
+    db_conversations_table_name: str = "conversations"
     db_user_conversations_table_columns: List[str] = ["id INTEGER PRIMARY KEY AUTOINCREMENT", "user_id TEXT", "timestamp INTEGER", "message_content TEXT", "sender TEXT", "is_recalled INTEGER", "is_ai INTEGER"]
+    # 覆盖索引：包含最近历史查询读取的全部列，查询只读索引、不回表（id 放在 timestamp 之后，与查询的排序一致）
+    db_conversations_table_index_columns: List[str] = ["user_id", "timestamp", "id", "sender", "message_content", "is_recalled", "is_ai"]
+    db_conversations_migrate_batch_size: int = 1000  # 旧版 "<user_id>_conversations" 表迁移时每批行数
 
     db_user_config_table_name: str = "user_config"
-    db_user_config_table_columns: List[str] = ["user_id INTEGER PRIMARY KEY", "personality TEXT", "temperature REAL", "max_history_length INTEGER"] 
+    db_user_config_table_columns: List[str] = ["user_id INTEGER PRIMARY KEY", "personality TEXT", "temperature REAL", "max_history_length INTEGER", "model TEXT"] 
+    user_config_cache_size: int = 1000  # 内存中最多缓存多少个用户的配置（LRU淘汰）
+    user_config_cache_ttl: int = 300  # 用户配置缓存有效期（秒）
 
 
     # 管理员用户ID列表
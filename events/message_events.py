@@ -17,7 +17,8 @@ class MessageSentEvent(Event):
     参数：
     - event: 消息事件
     - matcher: 消息匹配器
-    - response: 回复内容
+    - response: 回复内容（流式模式下为完整回复）
+    - streamed: 回复是否已在流式生成过程中分条发送（可选，默认False）
     '''
     def __new__(cls):
         if not hasattr(cls, 'instance'):
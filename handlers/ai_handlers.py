@@ -6,6 +6,7 @@
 
 包含：
 - BaseModelHandler：模型处理器基类
+- ProviderError：流式生成出错时抛出
 - 各厂商模型的具体实现类
 
 维护建议：
@@ -14,16 +15,37 @@
 3. 注意不同模型的速率限制
 """
 
+import asyncio
+import json
+
 import aiohttp
 import openai
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 from ..managers.user_manager import UserManager
+from ..managers.connection_manager import ConnectionManager
 from ..config import config, logger
 from ..models import ConversationHistory
+from ..service.deadline import current_deadline
+
+
+class ProviderError(Exception):
+    """模型接口调用失败（异常消息为回复给用户的提示）"""
+
+
+def _request_timeout() -> Optional[float]:
+    """本次调用的超时时间：当前请求的剩余时限，未设置时限时为 request_timeout（None表示不限制）"""
+    deadline = current_deadline.get()
+    if deadline is not None:
+        return deadline.timeout()
+    return config.request_timeout or None
+
 
 class BaseModelHandler:
     """模型处理器抽象基类"""
+    provider: str = ""  # 服务商标识，用于读取服务商相关配置
+    max_prompt_tokens: int = 0  # 提示词token预算，0表示不限制
+
     async def generate(self, prompt: List, user_id: str) -> List:
         """
         生成回复的通用接口
@@ -39,62 +61,192 @@ class BaseModelHandler:
         """
         raise NotImplementedError("子类必须实现generate方法")
 
+    @property
+    def configured(self) -> bool:
+        """是否已配置（填写了API密钥）"""
+        return False
+
+    async def warmup(self, connections: int) -> int:
+        """
+        预热到服务商的连接
+
+        参数：
+        - connections: 预热的连接数
+
+        返回：
+        - 成功建立的连接数（不支持预热时为0）
+        """
+        return 0
+
+    async def generate_stream(self, prompt: List, user_id: str) -> AsyncIterator[str]:
+        """
+        流式生成回复的通用接口
+
+        参数：
+        - prompt: 完整提示词
+        - user_id: 用户ID
+
+        返回：
+        - 逐段产出的回复文本（增量）
+
+        异常：
+        - ProviderError: 调用失败（可能已产出部分内容）
+
+        默认一次性产出 generate 的结果，支持流式的子类应重写此方法
+        """
+        response = await self.generate(prompt, user_id)
+        if response[1] == -1:
+            raise ProviderError(response[0])
+        yield response[0]
+
+
+async def _stream_chat_completions(
+    client: openai.AsyncOpenAI,
+    model_name: str,
+    prompt: List,
+    temperature: float,
+    provider_name: str
+) -> AsyncIterator[str]:
+    """
+    OpenAI兼容接口的流式调用（stream=True）
+
+    出错时记录日志并抛出 ProviderError（已产出的部分由调用方决定是否保留）。
+    """
+    try:
+        stream = await client.chat.completions.create(
+            model=model_name,
+            messages=prompt,
+            temperature=temperature,
+            stream=True,
+            timeout=_request_timeout()
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        logger.error(f"{provider_name} API流式请求错误: {str(e)}")
+        raise ProviderError("请求处理失败，请稍后再试") from e
+
 class OpenAIModelHandler(BaseModelHandler):
     """OpenAI系列模型处理器"""
+    provider = "openai"
+
     def __init__(self, model_name: str):
-        self.client = openai.AsyncOpenAI(
-            api_key=config.openai_api_key,
-            base_url=config.openai_base_url
-        )
         self.model_name = model_name
+        self.max_prompt_tokens = config.openai_max_prompt_tokens
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """服务商共用的客户端（首次使用时创建连接池）"""
+        return ConnectionManager().get_openai_client(
+            self.provider, config.openai_api_key, config.openai_base_url
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(config.openai_api_key)
+
+    async def warmup(self, connections: int) -> int:
+        """预热到服务商的连接（创建客户端并建立连接）"""
+        self.client  # 访问属性以确保客户端已创建
+        return await ConnectionManager().warm_openai_client(self.provider, config.openai_base_url, connections)
 
     async def generate(self, prompt: List, user_id: str) -> List:
         """调用OpenAI API生成回复"""
         try:
-            temperature = UserManager().get_user_config(user_id)["temperature"]
+            temperature = (await UserManager().get_user_config(user_id))["temperature"]
             response = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=prompt,
-                temperature=temperature
+                temperature=temperature,
+                timeout=_request_timeout()
             )
             return [response.choices[0].message.content, 1]
+        except openai.APITimeoutError:
+            logger.error("OpenAI API请求超时")
+            return [config.request_timeout_reply, -1]
         except Exception as e:
             logger.error(f"OpenAI API错误: {str(e)}")
             return ["请求处理失败，请稍后再试", -1]
 
+    async def generate_stream(self, prompt: List, user_id: str) -> AsyncIterator[str]:
+        """调用OpenAI API流式生成回复"""
+        temperature = (await UserManager().get_user_config(user_id))["temperature"]
+        async for delta in _stream_chat_completions(self.client, self.model_name, prompt, temperature, "OpenAI"):
+            yield delta
+
 class DeepSeekModelHandler(BaseModelHandler):
     """DeepSeek模型处理器"""
+    provider = "deepseek"
+
     def __init__(self, model_name: str):
-        self.client = openai.AsyncOpenAI(
-            api_key=config.deepseek_api_key,
-            base_url=config.deepseek_base_url
-        )
         self.model_name = model_name
+        self.max_prompt_tokens = config.deepseek_max_prompt_tokens
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """服务商共用的客户端（首次使用时创建连接池）"""
+        return ConnectionManager().get_openai_client(
+            self.provider, config.deepseek_api_key, config.deepseek_base_url
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(config.deepseek_api_key)
+
+    async def warmup(self, connections: int) -> int:
+        """预热到服务商的连接（创建客户端并建立连接）"""
+        self.client  # 访问属性以确保客户端已创建
+        return await ConnectionManager().warm_openai_client(self.provider, config.deepseek_base_url, connections)
 
     async def generate(self, prompt: List, user_id: str) -> List:
         """调用DeepSeek API生成回复"""
         try:
-            temperature = UserManager().get_user_config(user_id)["temperature"]
+            temperature = (await UserManager().get_user_config(user_id))["temperature"]
             response = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=prompt,
-                temperature=temperature
+                temperature=temperature,
+                timeout=_request_timeout()
             )
             return [response.choices[0].message.content, 1]
+        except openai.APITimeoutError:
+            logger.error("DeepSeek API请求超时")
+            return [config.request_timeout_reply, -1]
         except Exception as e:
             logger.error(f"DeepSeek API错误: {str(e)}")
             return ["请求处理失败，请稍后再试", -1]
 
+    async def generate_stream(self, prompt: List, user_id: str) -> AsyncIterator[str]:
+        """调用DeepSeek API流式生成回复"""
+        temperature = (await UserManager().get_user_config(user_id))["temperature"]
+        async for delta in _stream_chat_completions(self.client, self.model_name, prompt, temperature, "DeepSeek"):
+            yield delta
+
 class DoubaoModelHandler(BaseModelHandler):
     """Doubao模型处理器（基于原生HTTP请求）"""
+    provider = "doubao"
+
     def __init__(self, model_name: str):
         self.api_key = config.doubao_api_key
         self.model_name = model_name
         self.api_url = config.doubao_base_url
+        self.max_prompt_tokens = config.doubao_max_prompt_tokens
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def warmup(self, connections: int) -> int:
+        """预热到服务商的连接"""
+        return await ConnectionManager().warm_session(self.provider, self.api_url, connections)
 
     async def generate(self, prompt: List, user_id: str) -> List:
         """调用Doubao原生API生成回复"""
-        temperature = UserManager().get_user_config(user_id)["temperature"]
+        temperature = (await UserManager().get_user_config(user_id))["temperature"]
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -107,19 +259,23 @@ class DoubaoModelHandler(BaseModelHandler):
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        response_data = await response.json()
-                        return [response_data['choices'][0]['message']['content'], 1]
-                    else:
-                        error_info = await response.text()
-                        logger.error(f"API请求失败: {response.status} - {error_info}")
-                        return ["服务暂时不可用，请稍后重试", -1]
+            session = ConnectionManager().get_session(self.provider)
+            async with session.post(
+                self.api_url,
+                headers=headers,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=_request_timeout())
+            ) as response:
+                if response.status == 200:
+                    response_data = await response.json()
+                    return [response_data['choices'][0]['message']['content'], 1]
+                else:
+                    error_info = await response.text()
+                    logger.error(f"API请求失败: {response.status} - {error_info}")
+                    return ["服务暂时不可用，请稍后重试", -1]
+        except asyncio.TimeoutError:
+            logger.error("Doubao API请求超时")
+            return [config.request_timeout_reply, -1]
         except aiohttp.ClientError as e:
             logger.error(f"网络请求异常: {str(e)}")
             return ["网络连接异常，请检查您的网络", -1]
@@ -127,9 +283,64 @@ class DoubaoModelHandler(BaseModelHandler):
             logger.error(f"未知错误: {str(e)}")
             return ["服务处理异常，请联系管理员", -1]
 
+    async def generate_stream(self, prompt: List, user_id: str) -> AsyncIterator[str]:
+        """调用Doubao原生API流式生成回复（SSE）"""
+        temperature = (await UserManager().get_user_config(user_id))["temperature"]
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        payload = {
+            "model": self.model_name,
+            "messages": prompt,
+            "temperature": temperature,
+            "stream": True
+        }
+
+        try:
+            session = ConnectionManager().get_session(self.provider)
+            # 流式回复不限制总时长，只限制建立连接与每次读取的等待时间
+            timeout = _request_timeout()
+            async with session.post(
+                self.api_url,
+                headers=headers,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+            ) as response:
+                if response.status != 200:
+                    error_info = await response.text()
+                    logger.error(f"API请求失败: {response.status} - {error_info}")
+                    raise ProviderError("服务暂时不可用，请稍后重试")
+                # SSE：每个事件为一行 "data: {...}"，以 "data: [DONE]" 结束
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        yield delta
+        except ProviderError:
+            raise
+        except asyncio.TimeoutError as e:
+            logger.error("Doubao API流式请求超时")
+            raise ProviderError(config.request_timeout_reply) from e
+        except aiohttp.ClientError as e:
+            logger.error(f"网络请求异常: {str(e)}")
+            raise ProviderError("网络连接异常，请检查您的网络") from e
+        except Exception as e:
+            logger.error(f"未知错误: {str(e)}")
+            raise ProviderError("服务处理异常，请联系管理员") from e
+
 # 示例：待实现的Claude处理器
 class AnthropicModelHandler(BaseModelHandler):
     """Claude模型处理器（待实现）"""
+    provider = "anthropic"
+
     async def generate(self, prompt: str, history: ConversationHistory) -> List:
         # TODO: 实现具体逻辑
         return ["请求处理失败，请稍后再试", -1]
\ No newline at end of file
@@ -7,25 +7,30 @@
 维护建议：
 1. 保持日志逻辑独立
 2. 确保日志格式统一
+3. 日志处理器注册为后台处理器，不占用回复耗时
 """
 
+from nonebot.adapters.onebot.v11 import PrivateMessageEvent
 from nonebot.log import logger
+from nonebot.matcher import Matcher
 
+from ..events.message_events import MessageReceivedEvent, MessageSentEvent
 
-async def log_before_process(data: dict):
+
+@MessageReceivedEvent.on(priority=10, background=True)
+async def log_before_process(event: PrivateMessageEvent, matcher: Matcher):
     """
-    记录消息处理前的日志
+    记录消息处理前的日志（优先级高于消息处理，收到消息时即提交）
     """
-    user_id = data["user_id"]
-    message = data["message"]
+    user_id = str(event.user_id)
+    message = event.get_plaintext()
     logger.info(f"用户 {user_id} 发送消息：{message}")
 
 
-async def log_after_process(data: dict):
+@MessageSentEvent.on(background=True)
+async def log_after_process(event: PrivateMessageEvent, matcher: Matcher, response: str, streamed: bool = False):
     """
     记录消息处理后的日志
     """
-    user_id = data["user_id"]
-    message = data["message"]
-    response = data["response"]
+    user_id = str(event.user_id)
     logger.info(f"用户 {user_id} 收到回复：{response}")
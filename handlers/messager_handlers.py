@@ -10,17 +10,70 @@
 """
 
 import json
-from typing import List
+import re
+from typing import List, Optional, Tuple
 from nonebot.adapters.onebot.v11 import PrivateMessageEvent, Message
 from nonebot.matcher import Matcher
 
 from ..managers.conversation_manager import ConversationManager
 from ..managers.model_manager import ModelManager
-from ..managers.sql_manager import SQLiteManager
 from ..models import ConversationHistory
+from ..service.metrics import metrics
 from ..config import config
 from ..events.message_events import MessageSentEvent, MessageReceivedEvent
 
+# 句子结束：中英文句末标点（含连续标点）或换行
+_SENTENCE_END = re.compile(r"[。！？!?…~]+[”’\"')）]*|\n+")
+# 段落结束：空行
+_PARAGRAPH_END = re.compile(r"\n\s*\n")
+
+
+def split_segments(buffer: str, mode: str, min_chars: int) -> Tuple[List[str], str]:
+    """
+    从流式缓冲区中切出已完整的句子/段落
+
+    参数：
+    - buffer: 已收到但未发送的文本
+    - mode: 切分方式（sentence / paragraph）
+    - min_chars: 每段最少字符数，不足时与后续内容合并
+
+    返回：
+    - (可发送的片段列表, 剩余未完成的文本)
+    """
+    pattern = _PARAGRAPH_END if mode == "paragraph" else _SENTENCE_END
+    segments = []
+    start = 0
+    for match in pattern.finditer(buffer):
+        end = match.end()
+        if len(buffer[start:end].strip()) < min_chars:
+            continue
+        segments.append(buffer[start:end].strip())
+        start = end
+    return segments, buffer[start:]
+
+
+async def _send_streaming_reply(user_id: str, message: str, time: int, matcher: Matcher) -> Optional[str]:
+    """
+    流式生成回复，每凑够一个完整的句子/段落就作为单独的消息发送
+
+    返回：
+    - 完整的回复内容（用于保存）；消息已与后续消息合并回复时返回 None
+    """
+    full_response = ""
+    buffer = ""
+    async for delta in ModelManager().process_message_stream(user_id=user_id, message=message, time=time):
+        full_response += delta
+        buffer += delta
+        segments, buffer = split_segments(buffer, config.stream_reply_split, config.stream_reply_min_chars)
+        for segment in segments:
+            with metrics.timer("stage", stage="send"):
+                await matcher.send(Message(segment))
+    if buffer.strip():
+        with metrics.timer("stage", stage="send"):
+            await matcher.send(Message(buffer.strip()))
+    return full_response or None
+
+
 @MessageReceivedEvent.on(priority=5)
 async def handle_private_message(event: PrivateMessageEvent, matcher: Matcher):
     """
@@ -33,12 +86,14 @@ async def handle_private_message(event: PrivateMessageEvent, matcher: Matcher):
     user_id = str(event.user_id)
     message = event.get_plaintext()
     time = event.time
-    print(time)
-
-    print(message)
 
-    # 触发消息处理前事件
-    # await bus.event_before_process({"user_id": user_id, "message": message})
+    if config.stream_reply:
+        # 流式模式：边生成边按句发送，完整回复交给后续处理器保存
+        response = await _send_streaming_reply(user_id, message, time, matcher)
+        if response is None:
+            return
+        await MessageSentEvent().async_trigger(event=event, matcher=matcher, response=response, streamed=True)
+        return
 
     # 调用核心管理模块处理消息
     response = await ModelManager().process_message(
@@ -46,44 +101,31 @@ async def handle_private_message(event: PrivateMessageEvent, matcher: Matcher):
         message=message,
         time=time,
     )
-
-    # 触发消息处理后事件
-    # await bus.event_after_process({"user_id": user_id, "message": message, "response": response})
+    if response is None:
+        # 连续发送的消息只由最后一条统一回复
+        return
 
     # 发送回复
     await MessageSentEvent().async_trigger(event=event, matcher=matcher, response=response)
 
 
-@MessageReceivedEvent.on(priority=10)
-async def create_user_conversations_table(event: PrivateMessageEvent, matcher: Matcher):
-    """
-    创建用户会话表，如果表不存在
-    表名为：<user_id>_conversations
-
-    参数：
-    - event: 私聊消息事件
-    """
-    user_id = str(event.user_id)
-    table_name = f'"{user_id}_conversations"'
-
-    # 检查表是否存在
-    if not SQLiteManager().check_table_exists(table_name):
-        # 创建表
-        SQLiteManager().create_table(table_name, config.db_user_conversations_table_columns)
-
-@MessageSentEvent.on()
-async def send_message(event: PrivateMessageEvent, matcher: Matcher, response: str):
+@MessageSentEvent.on(concurrent=True)
+async def send_message(event: PrivateMessageEvent, matcher: Matcher, response: str, streamed: bool = False):
     """
     发送消息
 
     参数：
     - event: 私聊消息事件
+    - streamed: 回复是否已在流式生成过程中分条发送
     """
+    if streamed:
+        return
 
-    await matcher.finish(Message(response))
+    with metrics.timer("stage", stage="send"):
+        await matcher.send(Message(response))
 
-@MessageSentEvent.on()
-async def update_user_conversations_table_for_ai_reply(event: PrivateMessageEvent, matcher: Matcher, response: str):
+@MessageSentEvent.on(concurrent=True)
+async def update_user_conversations_table_for_ai_reply(event: PrivateMessageEvent, matcher: Matcher, response: str, streamed: bool = False):
     """
     更新用户会话表
 
@@ -102,4 +144,4 @@ async def update_user_conversations_table_for_ai_reply(event: PrivateMessageEven
     )
     
     # 更新用户会话表
-    ConversationManager().add_new_conversation(user_id=user_id, new_conversation=new_conversation)
\ No newline at end of file
+    await ConversationManager().add_new_conversation(user_id=user_id, new_conversation=new_conversation)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+连接管理模块
+功能：
+- 为每个服务商维护一个长连接池
+- 统一管理连接池的创建、预热与关闭
+
+包含：
+- ConnectionManager：连接池管理类
+
+维护建议：
+1. 连接池在首次使用时创建（需处于运行中的事件循环）
+2. 插件关闭时必须调用 close() 释放连接
+"""
+
+import asyncio
+import importlib.util
+import time
+from typing import Dict
+
+import aiohttp
+import httpx
+import openai
+
+from ..config import config, logger
+
+# 安装了 h2 时 httpx 才支持 HTTP/2
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class ConnectionManager:
+    _instance = None  # 类属性用于存储单例
+
+    def __new__(cls):
+        if cls._instance is None:
+            # 如果尚未实例化，则初始化新实例
+            cls._instance = super(ConnectionManager, cls).__new__(cls)
+            # 服务商 -> aiohttp 会话（原生HTTP接口使用）
+            cls._sessions: Dict[str, aiohttp.ClientSession] = {}
+            # 服务商 -> OpenAI兼容客户端（同一服务商的多个模型共用）
+            cls._openai_clients: Dict[str, openai.AsyncOpenAI] = {}
+            # 服务商 -> OpenAI兼容客户端底层的 httpx 客户端（预热时使用）
+            cls._http_clients: Dict[str, httpx.AsyncClient] = {}
+            # 服务商 -> 最近一次取用连接池的时间（用于判断空闲）
+            cls._last_used: Dict[str, float] = {}
+        return cls._instance
+
+    def idle_seconds(self, provider: str) -> float:
+        """服务商连接池已空闲的秒数（从未使用时为无穷大）"""
+        last_used = self._last_used.get(provider)
+        return time.monotonic() - last_used if last_used is not None else float("inf")
+
+    def get_session(self, provider: str) -> aiohttp.ClientSession:
+        """
+        获取服务商的 aiohttp 会话（不存在时创建）
+
+        参数：
+        - provider: 服务商标识
+
+        返回：
+        - 长期复用的 aiohttp.ClientSession
+        """
+        self._last_used[provider] = time.monotonic()
+        session = self._sessions.get(provider)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.http_pool_size,
+                keepalive_timeout=config.http_keepalive_timeout,
+                ttl_dns_cache=config.http_dns_cache_ttl
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[provider] = session
+            logger.info(f"已创建 {provider} 连接池（最大连接数 {config.http_pool_size}）")
+        return session
+
+    def get_openai_client(self, provider: str, api_key: str, base_url: str) -> openai.AsyncOpenAI:
+        """
+        获取服务商的 OpenAI 兼容客户端（不存在时创建）
+
+        参数：
+        - provider: 服务商标识
+        - api_key: API密钥
+        - base_url: 接口地址
+
+        返回：
+        - 长期复用的 openai.AsyncOpenAI
+        """
+        self._last_used[provider] = time.monotonic()
+        client = self._openai_clients.get(provider)
+        if client is None:
+            http2 = config.http2_enabled and _HTTP2_AVAILABLE
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=config.http_pool_size,
+                    max_keepalive_connections=config.http_pool_size,
+                    keepalive_expiry=config.http_keepalive_timeout
+                ),
+                http2=http2
+            )
+            # 重试由 ModelManager 在请求时限内统一处理，客户端自身不再重试
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            self._openai_clients[provider] = client
+            self._http_clients[provider] = http_client
+            logger.info(f"已创建 {provider} 连接池（最大连接数 {config.http_pool_size}，HTTP/2：{http2}）")
+        return client
+
+    async def warm_session(self, provider: str, url: str, connections: int) -> int:
+        """
+        预先建立 aiohttp 连接池中的连接
+
+        并发发送 connections 个 HEAD 请求，使连接池中保留相应数量的已握手连接。
+        任何HTTP响应（包括4xx）都说明连接已建立。
+
+        参数：
+        - provider: 服务商标识
+        - url: 服务商接口地址
+        - connections: 预热的连接数
+
+        返回：
+        - 成功建立的连接数
+        """
+        session = self.get_session(provider)
+        timeout = aiohttp.ClientTimeout(total=config.provider_warmup_timeout)
+
+        async def probe() -> None:
+            async with session.head(url, timeout=timeout):
+                pass
+
+        results = await asyncio.gather(*(probe() for _ in range(connections)), return_exceptions=True)
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+    async def warm_openai_client(self, provider: str, url: str, connections: int) -> int:
+        """
+        预先建立 OpenAI 兼容客户端连接池中的连接（参数同 warm_session）
+
+        需先通过 get_openai_client 创建客户端。
+        """
+        http_client = self._http_clients.get(provider)
+        if http_client is None:
+            return 0
+        results = await asyncio.gather(
+            *(http_client.head(url, timeout=config.provider_warmup_timeout) for _ in range(connections)),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+    async def close(self) -> None:
+        """关闭所有连接池"""
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        for client in self._openai_clients.values():
+            await client.close()
+        self._sessions.clear()
+        self._openai_clients.clear()
+        self._http_clients.clear()
+        logger.info("所有服务商连接池已关闭")
@@ -1,10 +1,60 @@
 import json
-from typing import Dict, List
+import sys
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
 
-from ..config import config
-from ..models import ConversationHistory
+from ..config import config, logger
+from ..models import ConversationHistory, ConversationRecord, HistoryEntry
+from .prompt_manager import PromptManager
 from .sql_manager import SQLiteManager
 
+# 旧版按用户分表的表名后缀："<user_id>_conversations"
+LEGACY_TABLE_SUFFIX = "_conversations"
+
+# 估算缓存占用时每条消息的固定开销（对象本身及容器引用）
+_MESSAGE_OVERHEAD_BYTES = 256
+
+
+def _message_size(message: HistoryEntry) -> int:
+    """估算单条消息在缓存中的内存占用"""
+    return sys.getsizeof(message.message_content) + _MESSAGE_OVERHEAD_BYTES
+
+
+class _ConversationBuffer:
+    """单个用户最近消息的环形缓冲区（按时间正序）"""
+    __slots__ = ("messages", "nbytes", "complete")
+
+    def __init__(self, maxlen: int):
+        self.messages: Deque[HistoryEntry] = deque(maxlen=maxlen)
+        self.nbytes = 0
+        # 缓冲区是否包含该用户的全部历史（历史条数少于容量时为真）
+        self.complete = False
+
+    def append(self, message: HistoryEntry) -> None:
+        """追加消息，保持按时间戳有序，满时丢弃最旧的一条"""
+        if len(self.messages) == self.messages.maxlen:
+            self.nbytes -= _message_size(self.messages.popleft())
+            self.complete = False
+        index = len(self.messages)
+        while index > 0 and self.messages[index - 1].timestamp > message.timestamp:
+            index -= 1
+        self.messages.insert(index, message)
+        self.nbytes += _message_size(message)
+
+    def covers(self, limit: int, since: Optional[int]) -> bool:
+        """缓冲区能否给出与数据库查询相同的结果"""
+        if self.complete or len(self.messages) >= limit:
+            return True
+        return since is not None and bool(self.messages) and self.messages[0].timestamp < since
+
+    def recent(self, limit: int, since: Optional[int]) -> List[HistoryEntry]:
+        """取最近 limit 条（可选按时间戳过滤）"""
+        start = max(len(self.messages) - limit, 0)
+        recent = [self.messages[i] for i in range(start, len(self.messages))]
+        if since is not None:
+            recent = [m for m in recent if m.timestamp >= since]
+        return recent
+
 
 class ConversationManager:
     _instance = None  # 类属性用于存储单例
@@ -13,21 +63,45 @@ class ConversationManager:
         if cls._instance is None:
             # 如果尚未实例化，则初始化新实例
             cls._instance = super(ConversationManager, cls).__new__(cls)
-            cls._conversations: Dict[str, ConversationHistory] = {}
+            # 用户ID -> 最近消息缓冲区，按最近访问顺序排列（LRU）
+            cls._conversations: "OrderedDict[str, _ConversationBuffer]" = OrderedDict()
+            cls._cache_bytes = 0
+            # 正在从数据库加载的用户 -> 加载期间是否有新写入（有则不缓存本次结果）
+            cls._loading: Dict[str, bool] = {}
         return cls._instance
-    
-    def get_history(self, user_id: str) -> List[ConversationHistory]:
+
+    @staticmethod
+    def _to_row(user_id: str, conversation: ConversationHistory) -> dict:
+        """
+        转换为共用对话表的行数据
+
+        :param user_id: 会话所属用户ID
+        :param conversation: 对话
+        :return: 行数据字典（sender 为消息实际发送者）
+        """
+        row = conversation.to_db_dict()
+        row["sender"] = row.pop("user_id")
+        row["user_id"] = user_id
+        return row
+
+    async def get_history(self, user_id: str) -> List[HistoryEntry]:
         """
         获取用户的对话历史
 
         :param user_id: 用户ID
-        :return: ConversationHistory对象
+        :return: 对话历史列表（ConversationRecord）
         """
-        history = SQLiteManager().query(table_name=f'"{user_id}_conversations"', dump=True)
+        history = await SQLiteManager().async_query(
+            table_name=config.db_conversations_table_name,
+            where="user_id",
+            params=[user_id],
+            order_by="timestamp, id",
+            dump=True
+        )
 
         if history:
-            return [ConversationHistory(
-                user_id=h["user_id"],
+            return [ConversationRecord(
+                user_id=h["sender"] or h["user_id"],
                 timestamp=h["timestamp"],
                 message_content=h["message_content"],
                 is_recalled=h["is_recalled"],
@@ -36,7 +110,97 @@ class ConversationManager:
         else:
             return []
 
-    def update_conversation(self, user_id: str, new_conversation: ConversationHistory):
+    async def get_recent_history(
+        self,
+        user_id: str,
+        limit: int,
+        since: Optional[int] = None
+    ) -> List[HistoryEntry]:
+        """
+        获取用户最近的对话历史（按时间正序）
+
+        优先从内存缓冲区读取；未缓存时从数据库加载最近
+        conversation_cache_size 条填充缓冲区。
+
+        :param user_id: 用户ID
+        :param limit: 最多返回的条数
+        :param since: 仅返回该时间戳（含）之后的消息
+        :return: 对话历史列表（ConversationHistory 或 ConversationRecord）
+        """
+        buffer = self._conversations.get(user_id)
+        if buffer is not None and buffer.covers(limit, since):
+            self._conversations.move_to_end(user_id)
+            return buffer.recent(limit, since)
+
+        if limit > config.conversation_cache_size or since is not None:
+            # 超出缓冲区容量或带时间过滤的查询直接走数据库
+            return await self._query_recent_history(user_id, limit, since)
+
+        self._loading.setdefault(user_id, False)
+        try:
+            history = await self._query_recent_history(user_id, config.conversation_cache_size)
+        finally:
+            dirty = self._loading.pop(user_id, True)
+        if not dirty:
+            self._cache_history(user_id, history)
+        return history[-limit:] if limit else []
+
+    def _cache_history(self, user_id: str, history: List[HistoryEntry]):
+        """用数据库中加载的最近历史填充用户缓冲区"""
+        self.clear_conversation(user_id)
+        buffer = _ConversationBuffer(config.conversation_cache_size)
+        for message in history:
+            buffer.append(message)
+        buffer.complete = len(history) < config.conversation_cache_size
+        self._conversations[user_id] = buffer
+        self._cache_bytes += buffer.nbytes
+        self._evict()
+
+    def _evict(self):
+        """按LRU顺序淘汰，直到用户数和内存预算都满足限制"""
+        while len(self._conversations) > 1 and (
+            len(self._conversations) > config.conversation_cache_max_users
+            or self._cache_bytes > config.conversation_cache_max_bytes
+        ):
+            _, buffer = self._conversations.popitem(last=False)
+            self._cache_bytes -= buffer.nbytes
+
+    async def _query_recent_history(
+        self,
+        user_id: str,
+        limit: int,
+        since: Optional[int] = None
+    ) -> List[HistoryEntry]:
+        """
+        从数据库获取用户最近的对话历史（按时间正序）
+
+        通过 (user_id, timestamp, id, ...) 覆盖索引倒序取最近 limit 条，
+        查询的列都在索引中，无需回表，耗时与用户的历史总量无关。
+
+        :param user_id: 用户ID
+        :param limit: 最多返回的条数
+        :param since: 仅返回该时间戳（含）之后的消息
+        :return: 对话历史列表（ConversationRecord）
+        """
+        sql = (
+            "SELECT sender, user_id, timestamp, message_content, is_recalled, is_ai "
+            f"FROM {config.db_conversations_table_name} WHERE user_id = ?"
+        )
+        params: list = [user_id]
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        rows = await SQLiteManager().async_query_raw(sql, params)
+        # 数据写入前已校验，读取走无校验的快速构造
+        return [
+            ConversationRecord(sender or owner, timestamp, message_content, is_recalled, is_ai)
+            for sender, owner, timestamp, message_content, is_recalled, is_ai in reversed(rows)
+        ]
+
+    async def update_conversation(self, user_id: str, new_conversation: ConversationHistory):
         """
         保存对话至数据库
         ***（完全覆盖）***
@@ -44,20 +208,81 @@ class ConversationManager:
         :param user_id: 用户ID
         :param conversation: 对话
         """
-        SQLiteManager().insert(table_name=f'"{user_id}_conversations"', data=new_conversation.to_dict())
+        await SQLiteManager().async_insert(
+            table_name=config.db_conversations_table_name,
+            data=self._to_row(user_id, new_conversation)
+        )
 
-    def add_new_conversation(self, user_id: str, new_conversation: ConversationHistory):
+    async def add_new_conversation(self, user_id: str, new_conversation: ConversationHistory):
         """
         添加新对话
-        ***（仅添加新对话）***
+        ***（仅添加新对话，经延迟写入队列批量提交）***
 
         :param user_id: 用户ID
         :param new_conversation: 新的对话
         """
+        buffer = self._conversations.get(user_id)
+        if buffer is not None:
+            self._cache_bytes -= buffer.nbytes
+            buffer.append(new_conversation)
+            self._cache_bytes += buffer.nbytes
+            self._conversations.move_to_end(user_id)
+            self._evict()
+        if user_id in self._loading:
+            self._loading[user_id] = True
 
-        SQLiteManager().insert(table_name=f'"{user_id}_conversations"', data=new_conversation.to_db_dict())
+        await SQLiteManager().async_insert_deferred(
+            table_name=config.db_conversations_table_name,
+            data=self._to_row(user_id, new_conversation)
+        )
 
     def clear_conversation(self, user_id: str):
-        """清除用户的对话"""
-        if user_id in self._conversations:
-            del self._conversations[user_id]
\ No newline at end of file
+        """清除内存中缓存的用户对话"""
+        buffer = self._conversations.pop(user_id, None)
+        if buffer is not None:
+            self._cache_bytes -= buffer.nbytes
+        if user_id in self._loading:
+            self._loading[user_id] = True
+
+    async def migrate_legacy_tables(self, batch_size: int = None) -> Dict[str, int]:
+        """
+        将旧版 "<user_id>_conversations" 表迁移到共用对话表
+
+        每张表按批次搬移（每批一个事务，搬移后从旧表删除），全部搬完后删除旧表并清除该用户的对话缓存，
+        可重复执行；批次之间会让出数据库线程，不会长时间阻塞正常消息。
+
+        :param batch_size: 每批行数（默认读取配置）
+        :return: 迁移统计 {"tables": 表数量, "rows": 行数量}
+        """
+        batch_size = batch_size or config.db_conversations_migrate_batch_size
+        target_columns = ["user_id", "timestamp", "message_content", "sender", "is_recalled", "is_ai"]
+        # 旧表中的 user_id 列存放的是发送者，会话所属用户来自表名
+        select_exprs = ["?", "timestamp", "message_content", "user_id", "is_recalled", "is_ai"]
+
+        tables = rows = 0
+        for table in SQLiteManager().list_tables(suffix=LEGACY_TABLE_SUFFIX):
+            owner = table[:-len(LEGACY_TABLE_SUFFIX)]
+            if not owner:
+                continue
+            quoted = f'"{table}"'
+            while True:
+                moved = await SQLiteManager().async_move_rows(
+                    source_table=quoted,
+                    target_table=config.db_conversations_table_name,
+                    target_columns=target_columns,
+                    select_exprs=select_exprs,
+                    params=[owner],
+                    batch_size=batch_size
+                )
+                if not moved:
+                    break
+                rows += moved
+            await SQLiteManager().async_drop_table(quoted)
+            # 迁移前已缓存（或正在载入）的对话只含共用表中的记录，需重新载入才能看到迁移的历史
+            self.clear_conversation(owner)
+            PromptManager().invalidate(owner)
+            tables += 1
+            logger.info(f"已迁移对话表 {table}")
+
+        logger.info(f"对话表迁移完成：{tables} 张表，{rows} 条记录")
+        return {"tables": tables, "rows": rows}
@@ -13,23 +13,43 @@
 2. 核心业务流程修改需谨慎
 """
 
-from datetime import datetime
-from typing import Dict, Callable, List
+import asyncio
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Callable, List, Optional, Tuple
 
 from .user_manager import UserManager
 
 from .conversation_manager import ConversationManager
+from .connection_manager import ConnectionManager
+from .prompt_manager import PromptManager, estimate_tokens
+from .provider_manager import ProviderManager
 from .sql_manager import SQLiteManager
 from ..config import config, logger
-from ..models import ConversationHistory
+from ..models import ConversationHistory, HistoryEntry
+from ..service.breaker import CircuitBreaker
+from ..service.deadline import Deadline, current_deadline
+from ..service.limiter import AdmissionController, ProviderBusyError
+from ..service.metrics import metrics
+from ..service.scheduler import FairScheduler
 from ..handlers.ai_handlers import (
     BaseModelHandler,
+    ProviderError,
     OpenAIModelHandler,
     DeepSeekModelHandler,
     AnthropicModelHandler,
     DoubaoModelHandler
 )
 
+# 自动选择模型（按实时耗时、错误率与成本）
+AUTO_MODEL = "auto"
+
+# 请求在本地被拒绝（已熔断或服务商繁忙）时的状态码，不会重试
+_REJECTED = -2
+
+
 class ModelManager:
     _instance = None  # 类属性用于存储单例
 
@@ -45,6 +65,14 @@ class ModelManager:
             cls._instance = super(ModelManager, cls).__new__(cls)
             cls._handlers: Dict[str, Callable] = {}
             cls._current_model = config.default_model
+            # 用户ID -> 最近一条消息的序号（用于合并连续发送的消息）
+            cls._burst_seq: Dict[str, int] = {}
+            # 用户ID -> 最近一次生成的序号 / 尚未结束的生成数 / 进行中的生成（用于取代过时的生成）
+            # 序号全局递增，用户的登记在其生成全部结束后删除，删除后不会与仍在进行的旧生成重号
+            cls._generation_counter = itertools.count(1)
+            cls._generation_seq: Dict[str, int] = {}
+            cls._generation_live: Dict[str, int] = {}
+            cls._inflight: Dict[str, asyncio.Future] = {}
             cls._instance._init_handlers()
         return cls._instance
 
@@ -62,6 +90,11 @@ class ModelManager:
             "claude": AnthropicModelHandler()
         }
 
+        # 服务商 -> 准入控制器（同一服务商的多个模型共用限额，首次使用时创建）
+        self._limiters: Dict[str, AdmissionController] = {}
+        # 所有模型共用的公平调度器
+        self._scheduler = FairScheduler(config.scheduler_max_concurrency, config.scheduler_quantum)
+
     @property
     def available_models(self) -> list:
         """
@@ -72,12 +105,169 @@ class ModelManager:
         """
         return list(self._handlers.keys())
 
+    def route(self, requested: Optional[str] = None) -> str:
+        """
+        选择本次调用的模型
+
+        参数：
+        - requested: 用户选择的模型（模型名或 "auto"），为空时使用默认模型
+
+        返回：
+        - 模型名；用户选择的模型不存在时退回默认模型
+        """
+        model = requested or self._current_model
+        if model != AUTO_MODEL and model not in self._handlers:
+            logger.warning(f"模型 {model} 不存在，改用默认模型")
+            model = self._current_model
+        if model == AUTO_MODEL:
+            return self._auto_model()
+        return model
+
+    def _auto_model(self) -> str:
+        """
+        自动选择模型
+
+        在未熔断的已配置候选模型中选得分最低的（见 ProviderManager.score），
+        并以 model_explore_rate 的概率随机选择，使所有候选的耗时统计保持更新。
+        """
+        names = config.model_auto_candidates or list(self._handlers)
+        candidates = [
+            name for name in names
+            if name in self._handlers and self._handlers[name].configured
+            and ProviderManager().breaker(name).state != CircuitBreaker.OPEN
+        ]
+        if not candidates:
+            # 没有可用的候选时交给熔断逻辑处理（快速失败或改用备用模型）
+            candidates = [name for name in names if name in self._handlers] or list(self._handlers)
+        if len(candidates) > 1 and random.random() < config.model_explore_rate:
+            return random.choice(candidates)
+        return min(candidates, key=ProviderManager().score)
+
+    def _configured_providers(self) -> Dict[str, BaseModelHandler]:
+        """
+        获取已配置的服务商（同一服务商只保留一个处理器）
+
+        返回:
+        - 服务商标识 -> 处理器
+        """
+        providers: Dict[str, BaseModelHandler] = {}
+        for handler in self._handlers.values():
+            if handler.configured:
+                providers.setdefault(handler.provider, handler)
+        return providers
+
+    async def warmup_providers(self, idle_only: bool = False) -> None:
+        """
+        预热到各服务商的连接
+
+        参数：
+        - idle_only: 仅预热空闲时间超过保温间隔的服务商
+        """
+        providers = self._configured_providers()
+        if idle_only:
+            providers = {
+                provider: handler for provider, handler in providers.items()
+                if ConnectionManager().idle_seconds(provider) >= config.provider_keep_warm_interval
+            }
+        if not providers:
+            return
+
+        async def warm(provider: str, handler: BaseModelHandler) -> None:
+            start = time.perf_counter()
+            try:
+                connected = await handler.warmup(config.provider_warmup_connections)
+            except Exception as e:
+                logger.warning(f"服务商 {provider} 预热失败: {str(e)}")
+                return
+            cost = (time.perf_counter() - start) * 1000
+            logger.info(
+                f"服务商 {provider} 预热完成：{connected}/{config.provider_warmup_connections} 个连接，耗时 {cost:.0f} ms"
+            )
+
+        await asyncio.gather(*(warm(provider, handler) for provider, handler in providers.items()))
+
+    async def keep_warm(self) -> None:
+        """空闲保温循环：定期为空闲的服务商重新预热连接（需作为后台任务运行）"""
+        while True:
+            await asyncio.sleep(config.provider_keep_warm_interval)
+            await self.warmup_providers(idle_only=True)
+
+    async def wait_for_pause(self, user_id: str) -> bool:
+        """
+        等待用户停止连续发送消息
+
+        每条消息到达后等待 message_debounce_seconds 秒，期间同一用户若有新消息，
+        本条消息不再生成回复，由最后一条消息对整串消息统一回复。
+
+        参数：
+        - user_id: 用户唯一标识
+
+        返回：
+        - 本条消息是否为这一串消息中的最后一条（是则需要生成回复）
+        """
+        if config.message_debounce_seconds <= 0:
+            return True
+        seq = self._burst_seq.get(user_id, 0) + 1
+        self._burst_seq[user_id] = seq
+        await asyncio.sleep(config.message_debounce_seconds)
+        if self._burst_seq.get(user_id) != seq:
+            return False
+        del self._burst_seq[user_id]
+        return True
+
+    def _begin_generation(self, user_id: str) -> Tuple[int, Optional[asyncio.Future]]:
+        """
+        登记用户的一次新生成
+
+        按 inflight_policy 处理该用户仍在进行中的上一次生成：
+        - cancel: 立即取消上一次生成
+        - drop: 上一次生成继续完成，但结果被丢弃
+        - queue: 本次生成排在上一次之后执行
+
+        返回：
+        - (本次生成的序号, 仍在进行中的上一次生成)
+        """
+        seq = next(self._generation_counter)
+        self._generation_seq[user_id] = seq
+        self._generation_live[user_id] = self._generation_live.get(user_id, 0) + 1
+        previous = self._inflight.get(user_id)
+        if previous is not None and previous.done():
+            previous = None
+        if previous is not None and config.inflight_policy == "cancel":
+            previous.cancel()
+        return seq, previous
+
+    def _end_generation(self, user_id: str, inflight: asyncio.Future) -> None:
+        """
+        生成结束后移除在途登记
+
+        该用户的生成全部结束后才删除序号登记：较新的生成先结束时，
+        仍在进行的旧生成需要依据序号登记判断自己已被取代。
+        """
+        if not inflight.done():
+            inflight.set_result(None)
+        if self._inflight.get(user_id) is inflight:
+            del self._inflight[user_id]
+        live = self._generation_live[user_id] - 1
+        if live:
+            self._generation_live[user_id] = live
+        else:
+            del self._generation_live[user_id]
+            del self._generation_seq[user_id]
+
+    def is_superseded(self, user_id: str, seq: int) -> bool:
+        """序号为 seq 的生成是否已被该用户更新的消息取代（queue 策略下不会被取代）"""
+        if config.inflight_policy == "queue":
+            return False
+        latest = self._generation_seq.get(user_id)
+        return latest is not None and latest != seq
+
     async def process_message(
         self,
         user_id: str,
         message: str,
         time: int
-    ) -> str:
+    ) -> Optional[str]:
         """
         处理用户消息的完整流程
         
@@ -86,86 +276,440 @@ class ModelManager:
         - message: 用户消息内容
         
         返回：
-        - 生成的回复内容
+        - 生成的回复内容；消息已与后续消息合并回复、或生成已被更新的消息取代时返回 None
         """
-        # 先保存消息至数据库
+        # 先保存消息至数据库，再等待用户停止连续发送
+        await self.save_message(user_id, message, time)
+        if not await self.wait_for_pause(user_id):
+            return None
+
+        seq, previous = self._begin_generation(user_id)
+        deadline = Deadline(config.request_timeout)
+
+        async def run() -> str:
+            # 在新任务的上下文中设置时限，模型处理器与对冲请求均可读取
+            current_deadline.set(deadline)
+            if previous is not None and config.inflight_policy == "queue":
+                await asyncio.wait([previous])
+            return await self._reply(user_id)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[user_id] = task
         try:
-            # 保存消息至数据库
-            ConversationManager().add_new_conversation(
-                user_id=user_id,
-                new_conversation=ConversationHistory(
-                    user_id=user_id,
-                    timestamp=time,
-                    message_content=message,
-                    is_recalled=False,
-                    is_ai=False
-                )
-            )
-        except Exception as e:
-            logger.exception("消息保存流程异常")
+            response = await task
+        except asyncio.CancelledError:
+            if not self.is_superseded(user_id, seq):
+                raise
+            response = None
+        finally:
+            # 须在结束登记前判断：该用户的生成全部结束后序号登记即被删除
+            superseded = self.is_superseded(user_id, seq)
+            self._end_generation(user_id, task)
+
+        if superseded:
+            logger.info(f"用户 {user_id} 发送了新消息，已放弃旧的回复")
+            return None
+        return response
+
+    async def _reply(self, user_id: str) -> str:
+        """
+        根据用户当前的对话历史生成回复
+
+        返回：
+        - 生成的回复内容（失败时为提示信息）
+        """
+        deadline = current_deadline.get() or Deadline(config.request_timeout)
         try:
-            # 获取对话上下文
-            history: List[ConversationHistory] = ConversationManager().get_history(user_id)
-            user_config = UserManager().get_user_config(user_id)
-            personality = user_config["personality"]
-            
-            # 构建提示词
-            prompt = self._build_prompt(
-                personality=personality,
-                history=history
+            model, handler, prompt = await asyncio.wait_for(
+                self._prepare_prompt(user_id), deadline.timeout(config.request_db_timeout)
             )
             
-            # 调用模型生成
-            handler: BaseModelHandler = self._handlers[self._current_model]
-            response_list = await handler.generate(prompt, user_id)
+            # 在公平调度下调用模型生成（按配置对慢请求发出对冲请求）
+            async with self._scheduled(user_id, prompt, deadline):
+                response_list = await self._generate_hedged(model, handler, prompt, user_id)
             
-            if response_list[1] == -1:
+            if response_list[1] < 0:
                 return response_list[0]
 
             response = response_list[0]
             
             return response
+        except asyncio.TimeoutError:
+            logger.warning(f"用户 {user_id} 的回复生成超时")
+            return config.request_timeout_reply
         except Exception as e:
             logger.exception("消息处理流程异常")
             return "服务暂时不可用，请稍后重试"
 
-    def _build_prompt(self, personality: str, history: List[ConversationHistory]) -> List:
+    async def process_message_stream(
+        self,
+        user_id: str,
+        message: str,
+        time: int
+    ) -> AsyncIterator[str]:
+        """
+        处理用户消息的完整流程（流式）
+
+        参数：
+        - user_id: 用户唯一标识
+        - message: 用户消息内容
+
+        返回：
+        - 逐段产出的回复文本（增量）；消息已与后续消息合并回复时不产出任何内容，
+          生成过程中被更新的消息取代时提前结束（已产出的内容保留）
+        """
+        await self.save_message(user_id, message, time)
+        if not await self.wait_for_pause(user_id):
+            return
+
+        seq, previous = self._begin_generation(user_id)
+        deadline = Deadline(config.request_timeout)
+        loop = asyncio.get_running_loop()
+        inflight = loop.create_future()
+        self._inflight[user_id] = inflight
+        produced = False
+        breaker: Optional[CircuitBreaker] = None  # 已放行、尚未记录结果的熔断器
+        try:
+            if previous is not None and config.inflight_policy == "queue":
+                await asyncio.wait([previous])
+            model, handler, prompt = await asyncio.wait_for(
+                self._prepare_prompt(user_id), deadline.timeout(config.request_db_timeout)
+            )
+            async with self._scheduled(user_id, prompt, deadline):
+                selected = self._select_model(model, handler)
+                if selected is None:
+                    yield config.breaker_open_reply
+                    return
+                model, handler, breaker = selected
+                async with self._limiter(handler.provider).admit(self._prompt_tokens(prompt), deadline.timeout()):
+                    start = loop.time()
+                    stream = handler.generate_stream(prompt, user_id)
+                    try:
+                        while True:
+                            # 首个增量须在总时限内到达，之后相邻增量的间隔不超过 request_timeout
+                            timeout = deadline.timeout() if not produced else (config.request_timeout or None)
+                            try:
+                                delta = await asyncio.wait_for(stream.__anext__(), timeout)
+                            except StopAsyncIteration:
+                                break
+                            # 每个增量之间检查是否已被取代，取代后立即断开上游连接
+                            if self.is_superseded(user_id, seq) or inflight.cancelled():
+                                logger.info(f"用户 {user_id} 发送了新消息，已中止旧的回复")
+                                return
+                            if breaker is not None:
+                                # 流式回复以首个增量的耗时作为请求耗时
+                                breaker.record(True, loop.time() - start)
+                                metrics.observe("provider", loop.time() - start, model=model, outcome="ok")
+                                breaker = None
+                            produced = True
+                            yield delta
+                    except (ProviderError, asyncio.TimeoutError) as e:
+                        if breaker is not None:
+                            breaker.record(False, loop.time() - start)
+                            metrics.observe(
+                                "provider", loop.time() - start, model=model,
+                                outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                            )
+                            breaker = None
+                        raise
+                    finally:
+                        await stream.aclose()
+        except ProviderBusyError as e:
+            logger.warning(f"服务商繁忙，拒绝请求: {str(e)}")
+            if not produced:
+                yield config.provider_busy_reply
+        except ProviderError as e:
+            if not produced:
+                yield str(e)
+        except asyncio.TimeoutError:
+            logger.warning(f"用户 {user_id} 的回复生成超时")
+            if not produced:
+                yield config.request_timeout_reply
+        except Exception:
+            logger.exception("消息处理流程异常")
+            if not produced:
+                yield "服务暂时不可用，请稍后重试"
+        finally:
+            if breaker is not None:
+                breaker.abandon()
+            self._end_generation(user_id, inflight)
+
+    @asynccontextmanager
+    async def _scheduled(self, user_id: str, prompt: List, deadline: Deadline) -> AsyncIterator[None]:
+        """
+        在公平调度下执行一次生成（排队时间计入请求时限）
+
+        管理员（admin_user_ids）的请求优先放行，其余用户按估算token数轮流分配名额。
+        """
+        priority = 1 if user_id in map(str, config.admin_user_ids) else 0
+        async with self._scheduler.slot(user_id, self._prompt_tokens(prompt), priority, deadline.timeout()):
+            yield
+
+    def _limiter(self, provider: str) -> AdmissionController:
+        """获取服务商的准入控制器（不存在时按配置创建）"""
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            limiter = self._limiters[provider] = AdmissionController(
+                max_concurrency=getattr(config, f"{provider}_max_concurrency", 0),
+                rpm=getattr(config, f"{provider}_rpm", 0),
+                tpm=getattr(config, f"{provider}_tpm", 0),
+                queue_size=config.provider_queue_size,
+                queue_timeout=config.provider_queue_timeout
+            )
+        return limiter
+
+    @staticmethod
+    def _prompt_tokens(prompt: List) -> int:
+        """估算提示词的token数（用于每分钟token限额）"""
+        return sum(estimate_tokens(message["content"]) for message in prompt)
+
+    def _select_model(
+        self,
+        model: str,
+        handler: BaseModelHandler
+    ) -> Optional[Tuple[str, BaseModelHandler, CircuitBreaker]]:
+        """
+        按熔断状态选择实际调用的模型
+
+        原模型熔断时改用 breaker_fallback_model（需已配置且未熔断）。
+
+        返回：
+        - (模型名, 模型处理器, 已放行的熔断器)；原模型已熔断且没有可用的备用模型时返回 None
+        """
+        breaker = ProviderManager().breaker(model)
+        if breaker.allow():
+            return model, handler, breaker
+        fallback = config.breaker_fallback_model
+        fallback_handler = self._handlers.get(fallback)
+        if fallback != model and fallback_handler is not None and fallback_handler.configured:
+            fallback_breaker = ProviderManager().breaker(fallback)
+            if fallback_breaker.allow():
+                logger.info(f"{model} 已熔断，改用 {fallback}")
+                return fallback, fallback_handler, fallback_breaker
+        logger.warning(f"{model} 已熔断，快速失败")
+        return None
+
+    async def _generate(self, model: str, handler: BaseModelHandler, prompt: List, user_id: str) -> List:
+        """
+        调用模型生成，失败时在剩余时间内按随机退避重试
+
+        第n次重试前随机等待 0 ~ provider_retry_backoff * 2^(n-1) 秒，剩余时间不足以等待时不再重试。
+
+        返回：
+        - [回复内容, 状态码]
+        """
+        deadline = current_deadline.get()
+        attempt = 0
+        while True:
+            response = await self._call_model(model, handler, prompt, user_id)
+            if response[1] != -1 or attempt >= config.provider_max_retries:
+                return response
+            attempt += 1
+            backoff = random.uniform(0, config.provider_retry_backoff * 2 ** (attempt - 1))
+            if deadline is not None and deadline.remaining <= backoff:
+                return response
+            logger.info(f"{model} 调用失败，{backoff:.2f} 秒后第 {attempt} 次重试")
+            await asyncio.sleep(backoff)
+
+    async def _call_model(self, model: str, handler: BaseModelHandler, prompt: List, user_id: str) -> List:
+        """
+        在熔断、服务商准入控制与时限下调用一次模型，并记录请求结果与耗时
+
+        返回：
+        - [回复内容, 状态码]，调用失败（可重试）时状态码为 -1，
+          熔断、服务商繁忙或排队用尽请求时限（不重试）时状态码为 _REJECTED
+        """
+        selected = self._select_model(model, handler)
+        if selected is None:
+            return [config.breaker_open_reply, _REJECTED]
+        model, handler, breaker = selected
+        deadline = current_deadline.get() or Deadline(config.request_timeout)
+
+        recorded = False
+        try:
+            async with self._limiter(handler.provider).admit(self._prompt_tokens(prompt), deadline.timeout()):
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        handler.generate(prompt, user_id),
+                        deadline.timeout(config.provider_attempt_timeout)
+                    )
+                except asyncio.TimeoutError:
+                    seconds = time.perf_counter() - start
+                    breaker.record(False, seconds)
+                    recorded = True
+                    metrics.observe("provider", seconds, model=model, outcome="timeout")
+                    logger.warning(f"{model} 调用超时")
+                    return [config.request_timeout_reply, -1]
+                except Exception:
+                    seconds = time.perf_counter() - start
+                    breaker.record(False, seconds)
+                    recorded = True
+                    metrics.observe("provider", seconds, model=model, outcome="error")
+                    raise
+                seconds = time.perf_counter() - start
+                ok = response[1] != -1
+                breaker.record(ok, seconds)
+                recorded = True
+                metrics.observe("provider", seconds, model=model, outcome="ok" if ok else "error")
+                if ok:
+                    ProviderManager().record_latency(model, seconds)
+                return response
+        except ProviderBusyError as e:
+            logger.warning(f"服务商 {handler.provider} 繁忙，拒绝请求: {str(e)}")
+            return [config.provider_busy_reply, _REJECTED]
+        except asyncio.TimeoutError:
+            # 排队等待用尽了请求时限，无需再重试
+            logger.warning(f"服务商 {handler.provider} 排队超过请求时限")
+            return [config.request_timeout_reply, _REJECTED]
+        finally:
+            if not recorded:
+                breaker.abandon()
+
+    def _hedge_target(self, model: str) -> Optional[Tuple[str, BaseModelHandler, float]]:
+        """
+        获取对冲目标
+
+        返回：
+        - (对冲模型名, 对冲模型处理器, 等待秒数)；未开启对冲、对冲模型不可用或耗时样本不足时返回 None
+        """
+        if not config.hedge_enabled:
+            return None
+        fallback = config.hedge_fallback_model
+        fallback_handler = self._handlers.get(fallback)
+        if fallback == model or fallback_handler is None or not fallback_handler.configured:
+            return None
+        delay = ProviderManager().hedge_delay(model)
+        if delay is None:
+            return None
+        return fallback, fallback_handler, delay
+
+    async def _generate_hedged(self, model: str, handler: BaseModelHandler, prompt: List, user_id: str) -> List:
+        """
+        调用模型生成，原请求超过近期耗时分位数仍未返回时向对冲模型发出同样的请求
+
+        两个请求中先成功返回的作为结果，另一个随即取消；先返回的失败时继续等待另一个。
+
+        返回：
+        - [回复内容, 状态码]
+        """
+        hedge = self._hedge_target(model)
+        if hedge is None:
+            return await self._generate(model, handler, prompt, user_id)
+        fallback, fallback_handler, delay = hedge
+
+        primary = asyncio.ensure_future(self._generate(model, handler, prompt, user_id))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            logger.info(f"{model} 超过 {delay:.2f} 秒未返回，向 {fallback} 发出对冲请求")
+            secondary = asyncio.ensure_future(self._generate(fallback, fallback_handler, prompt, user_id))
+            tasks.add(secondary)
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # 同时完成时优先取成功的结果
+                for task in sorted(done, key=lambda t: t.exception() is not None or t.result()[1] < 0):
+                    if task.exception() is None and (task.result()[1] >= 0 or not pending):
+                        ProviderManager().record_hedge(model, won=task is secondary)
+                        return task.result()
+                if not pending:
+                    # 两个请求都抛出了异常
+                    ProviderManager().record_hedge(model, won=False)
+                    return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def save_message(self, user_id: str, message: str, time: int):
+        """
+        保存用户消息至数据库
+
+        参数：
+        - user_id: 用户唯一标识
+        - message: 用户消息内容
+        - time: 消息时间戳
+        """
+        try:
+            with metrics.timer("stage", stage="db_save"):
+                await asyncio.wait_for(
+                    ConversationManager().add_new_conversation(
+                        user_id=user_id,
+                        new_conversation=ConversationHistory(
+                            user_id=user_id,
+                            timestamp=time,
+                            message_content=message,
+                            is_recalled=False,
+                            is_ai=False
+                        )
+                    ),
+                    config.request_db_timeout or None
+                )
+        except Exception as e:
+            logger.exception("消息保存流程异常")
+
+    async def _prepare_prompt(self, user_id: str) -> Tuple[str, BaseModelHandler, List]:
+        """
+        选择模型处理器并构建提示词
+
+        参数：
+        - user_id: 用户唯一标识
+
+        返回：
+        - (模型名, 模型处理器, 提示词)
+        """
+        with metrics.timer("stage", stage="get_user_config"):
+            user_config = await UserManager().get_user_config(user_id)
+        model = self.route(user_config.get("model"))
+        handler: BaseModelHandler = self._handlers[model]
+
+        # 获取对话上下文
+        # 按条数模式仅取最近 max_history_length 条；token预算模式取内存缓冲区内的全部消息，由预算决定保留多少
+        personality = user_config["personality"]
+        if handler.max_prompt_tokens > 0:
+            history_length = config.conversation_cache_size
+        else:
+            history_length = user_config["max_history_length"] or config.max_history_length
+        with metrics.timer("stage", stage="get_history"):
+            history: List[HistoryEntry] = await ConversationManager().get_recent_history(
+                user_id, limit=history_length
+            )
+
+        # 构建提示词
+        with metrics.timer("stage", stage="build_prompt"):
+            prompt = self._build_prompt(
+                user_id=user_id,
+                personality=personality,
+                history=history,
+                max_tokens=handler.max_prompt_tokens
+            )
+        return model, handler, prompt
+
+    def _build_prompt(
+        self,
+        user_id: str,
+        personality: str,
+        history: List[HistoryEntry],
+        max_tokens: int = 0
+    ) -> List:
         """
         构建提示词
         
         参数：
+        - user_id: 用户ID（用于复用已渲染的历史）
         - personality: 性格模板内容
-        - history: 对话历史记录列表
+        - history: 对话历史记录列表（调用方已截取好窗口）
+        - max_tokens: 提示词token预算（0表示不限制）
         
         返回：
         - 构建好的提示词
         可以直接作为json格式发送给模型
         """
-        if not personality:
-            personality = config.personality_default
-        
-        prompt = [{"role": "system", "content": datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "\n" + personality}]
-        
-        # 保留最近N条历史
-        history = history[-min(config.max_history_length, len(history)) :]
-        is_current = history[0].to_dict()["is_ai"]
-        current_user_conversation = ""
-        for msg in history[-config.max_history_length :]:
-            if is_current != msg.to_dict()["is_ai"]:
-                if is_current:
-                    prompt.append({"role": "assistant", "content": current_user_conversation})
-                else:
-                    prompt.append({"role": "user", "content": current_user_conversation})
-                current_user_conversation = ""
-                is_current = msg.to_dict()["is_ai"]
-            current_user_conversation += msg.to_conversation() + "\n\n"
-        
-        if history[0].to_dict()["is_ai"]:
-            prompt.append({"role": "assistant", "content": current_user_conversation})
-        else:
-            prompt.append({"role": "user", "content": current_user_conversation})
-            
-        return prompt
+        return PromptManager().build(user_id, personality, history, max_tokens)
 
     def update_history(self, history: ConversationHistory, message: str, response: str):
         """
@@ -0,0 +1,219 @@
+"""
+提示词管理模块
+功能：
+- 增量构建发送给模型的提示词
+- 缓存每个用户已渲染、已按角色合并的历史消息
+
+包含：
+- PromptManager：提示词缓存管理类
+- estimate_tokens：本地快速token估算
+
+维护建议：
+1. 渲染格式以 ConversationHistory.to_conversation 为准
+2. 修改渲染格式后需清空缓存（重启即可）
+"""
+
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+
+from ..config import config
+from ..models import HistoryEntry
+
+
+# 每条提示词消息的固定开销（角色标记等）
+_MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算文本的token数（无需加载分词器）
+
+    非ASCII字符（中文等）按每字1个token计，ASCII字符按每4个字符1个token计，
+    结果偏保守，用于控制请求体大小而非精确计费。
+    """
+    ascii_length = len(text.encode("ascii", "ignore"))
+    return (len(text) - ascii_length) + (ascii_length + 3) // 4
+
+
+def _message_key(message: HistoryEntry) -> Tuple:
+    """消息标识，用于判断缓存中的消息与新窗口中的消息是否为同一条"""
+    return (message.timestamp, message.is_ai, message.is_recalled, message.message_content)
+
+
+class _RenderedBlock:
+    """同一角色的连续消息（对应提示词中的一条 user/assistant 消息）"""
+    __slots__ = ("is_ai", "texts", "tokens", "total_tokens", "_content")
+
+    def __init__(self, is_ai: bool):
+        self.is_ai = is_ai
+        self.texts: Deque[str] = deque()
+        self.tokens: Deque[int] = deque()  # 每条消息的估算token数（渲染时计算一次）
+        self.total_tokens = 0
+        self._content: Optional[str] = None
+
+    def append(self, text: str) -> None:
+        tokens = estimate_tokens(text)
+        self.texts.append(text)
+        self.tokens.append(tokens)
+        self.total_tokens += tokens
+        self._content = None
+
+    def popleft(self) -> None:
+        self.texts.popleft()
+        self.total_tokens -= self.tokens.popleft()
+        self._content = None
+
+    def tail_within(self, budget: int, at_least_one: bool = False) -> Tuple[str, int]:
+        """
+        在预算内尽量多地取该块末尾的消息
+
+        :param budget: 可用token数
+        :param at_least_one: 超出预算时是否仍保留最后一条
+        :return: (拼接后的内容, 消耗的token数)，一条都放不下时内容为空字符串
+        """
+        used = 0
+        count = 0
+        for tokens in reversed(self.tokens):
+            if used + tokens > budget and (count or not at_least_one):
+                break
+            used += tokens
+            count += 1
+        if not count:
+            return "", 0
+        texts = list(self.texts)[-count:]
+        return "".join(texts), used
+
+    @property
+    def content(self) -> str:
+        """合并后的消息内容（仅在块变化后重新拼接）"""
+        if self._content is None:
+            self._content = "".join(self.texts)
+        return self._content
+
+
+class _RenderedHistory:
+    """单个用户已渲染的历史窗口"""
+    __slots__ = ("keys", "blocks")
+
+    def __init__(self):
+        self.keys: Deque[Tuple] = deque()
+        self.blocks: Deque[_RenderedBlock] = deque()
+
+    def drop_head(self, count: int) -> None:
+        """从头部移除 count 条消息"""
+        for _ in range(count):
+            self.keys.popleft()
+            head = self.blocks[0]
+            head.popleft()
+            if not head.texts:
+                self.blocks.popleft()
+
+    def append(self, message: HistoryEntry, key: Tuple) -> None:
+        """渲染并追加一条消息"""
+        self.keys.append(key)
+        if not self.blocks or self.blocks[-1].is_ai != message.is_ai:
+            self.blocks.append(_RenderedBlock(message.is_ai))
+        self.blocks[-1].append(message.to_conversation() + "\n\n")
+
+    def overlap(self, keys: List[Tuple]) -> Optional[int]:
+        """
+        计算缓存窗口与新窗口的对齐位置
+
+        :param keys: 新窗口的消息标识列表
+        :return: 需要从缓存头部移除的条数；无法对齐时返回 None
+        """
+        if not self.keys or not keys:
+            return None
+        # 同一秒内重复发送相同内容时标识会重复，须比较整段重叠部分，不能只比较首尾
+        cached = list(self.keys)
+        for dropped in range(max(0, len(cached) - len(keys)), len(cached)):
+            if cached[dropped] == keys[0] and cached[dropped:] == keys[:len(cached) - dropped]:
+                return dropped
+        return None
+
+
+class PromptManager:
+    _instance = None  # 类属性用于存储单例
+
+    def __new__(cls):
+        if cls._instance is None:
+            # 如果尚未实例化，则初始化新实例
+            cls._instance = super(PromptManager, cls).__new__(cls)
+            # 用户ID -> 已渲染的历史窗口，按最近访问顺序排列（LRU）
+            cls._rendered: "OrderedDict[str, _RenderedHistory]" = OrderedDict()
+        return cls._instance
+
+    def build(
+        self,
+        user_id: str,
+        personality: str,
+        history: List[HistoryEntry],
+        max_tokens: int = 0
+    ) -> List:
+        """
+        构建提示词
+
+        与上次构建的窗口对齐后，只渲染新增的消息、从头部移除滑出窗口的消息；
+        无法对齐时（如历史被清空或重新加载）整体重建。
+
+        参数：
+        - user_id: 用户ID
+        - personality: 性格模板内容
+        - history: 对话历史窗口（按时间正序）
+        - max_tokens: 提示词token预算，大于0时从最新消息开始向前填充直到预算用完
+
+        返回：
+        - 构建好的提示词，可以直接作为json格式发送给模型
+        """
+        if not personality:
+            personality = config.personality_default
+
+        prompt = [{"role": "system", "content": datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "\n" + personality}]
+        if not history:
+            return prompt
+
+        keys = [_message_key(message) for message in history]
+        rendered = self._rendered.get(user_id)
+        dropped = rendered.overlap(keys) if rendered is not None else None
+        if dropped is None:
+            rendered = _RenderedHistory()
+            self._rendered[user_id] = rendered
+            start = 0
+        else:
+            rendered.drop_head(dropped)
+            start = len(rendered.keys)
+
+        for message, key in zip(history[start:], keys[start:]):
+            rendered.append(message, key)
+
+        self._rendered.move_to_end(user_id)
+        while len(self._rendered) > config.conversation_cache_max_users:
+            self._rendered.popitem(last=False)
+
+        if max_tokens <= 0:
+            for block in rendered.blocks:
+                prompt.append({"role": "assistant" if block.is_ai else "user", "content": block.content})
+            return prompt
+
+        # 按token预算从最新的消息向前填充，最新一条消息总会保留
+        budget = max_tokens - estimate_tokens(prompt[0]["content"]) - _MESSAGE_TOKEN_OVERHEAD
+        selected = []
+        for block in reversed(rendered.blocks):
+            budget -= _MESSAGE_TOKEN_OVERHEAD
+            if block.total_tokens <= budget:
+                content, used = block.content, block.total_tokens
+            else:
+                content, used = block.tail_within(budget, at_least_one=not selected)
+                if not content:
+                    break
+            selected.append({"role": "assistant" if block.is_ai else "user", "content": content})
+            budget -= used
+            if budget <= 0:
+                break
+        prompt.extend(reversed(selected))
+        return prompt
+
+    def invalidate(self, user_id: str) -> None:
+        """清除用户已渲染的历史（清空对话或修改性格后调用）"""
+        self._rendered.pop(user_id, None)
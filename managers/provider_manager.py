@@ -0,0 +1,161 @@
+"""
+服务商状态管理模块
+功能：
+- 记录每个模型最近的请求耗时，计算耗时分位数
+- 统计对冲请求的触发与获胜次数
+- 为每个模型维护一个熔断器
+- 按耗时、错误率与成本为模型打分（自动选择模型）
+
+包含：
+- ProviderManager：服务商状态管理类
+
+维护建议：
+1. 统计以模型名（ModelManager 中处理器的键）为单位
+2. 只记录成功请求的耗时，失败请求不参与分位数计算
+"""
+
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from ..config import config
+from ..service.breaker import CircuitBreaker
+
+
+class _ModelStats:
+    """单个模型的统计数据"""
+    __slots__ = ("latencies", "ewma_latency", "hedges", "hedge_wins", "breaker")
+
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=config.hedge_latency_window)
+        self.ewma_latency: Optional[float] = None  # 耗时的指数滑动平均（秒）
+        self.hedges = 0  # 触发对冲的次数
+        self.hedge_wins = 0  # 对冲请求先于原请求返回的次数
+        self.breaker = CircuitBreaker(
+            enabled=config.breaker_enabled,
+            window=config.breaker_window,
+            min_calls=config.breaker_min_calls,
+            error_rate=config.breaker_error_rate,
+            slow_call_seconds=config.breaker_slow_call_seconds,
+            slow_call_rate=config.breaker_slow_call_rate,
+            open_seconds=config.breaker_open_seconds,
+            half_open_probes=config.breaker_half_open_probes
+        )
+
+
+class ProviderManager:
+    _instance = None  # 类属性用于存储单例
+
+    def __new__(cls):
+        if cls._instance is None:
+            # 如果尚未实例化，则初始化新实例
+            cls._instance = super(ProviderManager, cls).__new__(cls)
+            # 模型名 -> 统计数据
+            cls._stats: Dict[str, _ModelStats] = {}
+        return cls._instance
+
+    def _get(self, model: str) -> _ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = _ModelStats()
+        return stats
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """获取模型的熔断器"""
+        return self._get(model).breaker
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        """记录一次成功请求的耗时（秒）"""
+        stats = self._get(model)
+        stats.latencies.append(seconds)
+        if stats.ewma_latency is None:
+            stats.ewma_latency = seconds
+        else:
+            alpha = config.model_latency_ewma_alpha
+            stats.ewma_latency = alpha * seconds + (1 - alpha) * stats.ewma_latency
+
+    def score(self, model: str) -> float:
+        """
+        模型的综合得分（越低越好）
+
+        得分 = 平均耗时 * (1 + model_error_penalty * 错误率) * 成本；
+        从未调用过的模型得分为0，会被优先尝试；调用过但从未成功的模型以已知最慢的平均耗时
+        （都没有时为 request_timeout）作为平均耗时，并同样计入错误率惩罚，不会一直被选中。
+        """
+        stats = self._stats.get(model)
+        if stats is None or (stats.ewma_latency is None and not stats.breaker.calls):
+            return 0.0
+        latency = stats.ewma_latency
+        if latency is None:
+            known = [other.ewma_latency for other in self._stats.values() if other.ewma_latency is not None]
+            latency = max(known) if known else (config.request_timeout or 60)
+        return (
+            latency
+            * (1 + config.model_error_penalty * stats.breaker.error_rate)
+            * config.model_cost_weights.get(model, 1.0)
+        )
+
+    def latency_percentile(self, model: str, percentile: float) -> Optional[float]:
+        """
+        计算模型最近请求耗时的分位数
+
+        参数：
+        - model: 模型名
+        - percentile: 分位数（0~100）
+
+        返回：
+        - 耗时（秒）；样本数少于 hedge_min_samples 时返回 None
+        """
+        stats = self._stats.get(model)
+        if stats is None or len(stats.latencies) < config.hedge_min_samples:
+            return None
+        ordered = sorted(stats.latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """
+        原请求等待多久仍未返回时发出对冲请求
+
+        返回：
+        - 等待秒数（不低于 hedge_min_delay）；样本不足时返回 None，表示不对冲
+        """
+        latency = self.latency_percentile(model, config.hedge_percentile)
+        if latency is None:
+            return None
+        return max(latency, config.hedge_min_delay)
+
+    def record_hedge(self, model: str, won: bool) -> None:
+        """
+        记录一次对冲
+
+        参数：
+        - model: 原请求的模型名
+        - won: 对冲请求是否先于原请求返回
+        """
+        stats = self._get(model)
+        stats.hedges += 1
+        if won:
+            stats.hedge_wins += 1
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        获取各模型的统计数据
+
+        返回：
+        - {模型名: {"samples", "ewma", "p50", "p95", "hedges", "hedge_wins", "breaker"}}，耗时单位为秒，
+          breaker 为熔断器状态摘要（见 CircuitBreaker.snapshot）
+        """
+        result = {}
+        for model, stats in self._stats.items():
+            ordered = sorted(stats.latencies)
+            result[model] = {
+                "samples": len(ordered),
+                "ewma": stats.ewma_latency,
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)] if ordered else None,
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+                "breaker": stats.breaker.snapshot()
+            }
+        return result
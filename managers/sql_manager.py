@@ -1,13 +1,27 @@
-from typing import Any, Dict, List, Optional
-import sqlite3
-from ..config import config, logger
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+import asyncio
 import os
-import json
-
-from typing import Any, Dict, List, Optional, Union
 import sqlite3
+import threading
+
 from ..config import config, logger
-import os
+
+
+def _synchronized(func: Callable) -> Callable:
+    """
+    串行化装饰器
+
+    事件循环线程与数据库线程共用同一连接和游标，
+    所有读写操作必须持有连接锁后再执行。
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return func(self, *args, **kwargs)
+    return wrapper
+
 
 class SQLiteManager:
     _instance = None
@@ -23,11 +37,37 @@ class SQLiteManager:
     def _init_database(self):
         """单例初始化时仅执行一次的连接"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self.conn = sqlite3.connect(self.db_path)
+        # 连接会在专用数据库线程中使用，因此关闭同线程检查，由 _lock 保证串行
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self._lock = threading.RLock()
+        # 单线程执行器：所有异步接口都在此线程中排队执行，保证写入顺序
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmai-db")
         self.conn.execute("PRAGMA foreign_keys = ON")  # 启用外键约束
+        if config.db_wal_mode:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+        synchronous = config.db_synchronous.upper()
+        if synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"无效的 db_synchronous 配置: {config.db_synchronous}")
+        self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+        # 延迟写入队列：(表名, 列名元组, 值元组)，按批次合并为一个事务提交
+        self._pending_rows: List[Tuple[str, Tuple[str, ...], tuple]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 定时提交任务（保留引用，避免执行中被垃圾回收）
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # 已知表结构登记表：启动时从 sqlite_master 载入，建表后同步登记，
+        # 热路径只需查内存集合，不再反复执行 CREATE TABLE IF NOT EXISTS
+        self._known_tables = {
+            row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        }
         logger.info(f"Connected to database at {self.db_path}")
 
+    @staticmethod
+    def _normalize_table_name(table_name: str) -> str:
+        """去除表名两侧的引号，便于与 sqlite_master 中的名称比较"""
+        return table_name.strip('"')
+
+    @_synchronized
     def create_table(self, table_name: str, columns: list, constraints: list = None):
         """创建表（移除冗余的 create_db 调用）"""
         try:
@@ -43,6 +83,7 @@ class SQLiteManager:
             self.conn.rollback()
             raise
         
+    @_synchronized
     def create_table(self, table_name: str, columns: List[str], constraints: List[str] = None):
         """
         创建数据表
@@ -59,7 +100,137 @@ class SQLiteManager:
         self.cursor.execute(query)
         self.conn.commit()
         logger.info(f"Created table {table_name}")
+        self._known_tables.add(self._normalize_table_name(table_name))
 
+    def ensure_table(self, table_name: str, columns: List[str], constraints: List[str] = None):
+        """
+        确保数据表存在（已登记的表直接返回，不访问数据库）
+
+        :param table_name: 表名称
+        :param columns: 列定义列表
+        :param constraints: 表级约束条件
+        """
+        if self._normalize_table_name(table_name) in self._known_tables:
+            return
+        self.create_table(table_name, columns, constraints)
+
+    @_synchronized
+    def ensure_columns(self, table_name: str, columns: List[str]) -> List[str]:
+        """
+        确保数据表包含指定的列（旧版数据库升级时补充新增的列）
+
+        :param table_name: 表名称
+        :param columns: 列定义列表（如 "model TEXT"），已存在的列会被跳过
+        :return: 新增的列名列表
+        """
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        existing = {row[1] for row in self.cursor.fetchall()}
+        added = []
+        for column in columns:
+            name = column.split()[0]
+            if name in existing:
+                continue
+            self.cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column}")
+            added.append(name)
+        if added:
+            self.conn.commit()
+            logger.info(f"Added columns {', '.join(added)} to {table_name}")
+        return added
+
+    @_synchronized
+    def create_index(self, index_name: str, table_name: str, columns: List[str], unique: bool = False):
+        """
+        创建索引
+
+        :param index_name: 索引名称
+        :param table_name: 表名称
+        :param columns: 索引列，按顺序组成复合索引
+        :param unique: 是否唯一索引
+        """
+        unique_str = "UNIQUE " if unique else ""
+        query = f"CREATE {unique_str}INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})"
+        self.cursor.execute(query)
+        self.conn.commit()
+        logger.info(f"Created index {index_name} on {table_name}")
+
+    @_synchronized
+    def drop_index(self, index_name: str):
+        """
+        删除索引（不存在时忽略）
+
+        :param index_name: 索引名称
+        """
+        self.cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+        self.conn.commit()
+
+    @_synchronized
+    def drop_table(self, table_name: str):
+        """
+        删除数据表
+
+        :param table_name: 表名称
+        """
+        self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        self.conn.commit()
+        self._known_tables.discard(self._normalize_table_name(table_name))
+        logger.info(f"Dropped table {table_name}")
+
+    @_synchronized
+    def list_tables(self, suffix: str = "") -> List[str]:
+        """
+        列出已登记的数据表
+
+        :param suffix: 仅返回以该后缀结尾的表名
+        :return: 表名列表
+        """
+        return sorted(name for name in self._known_tables if name.endswith(suffix))
+
+    @_synchronized
+    def move_rows(
+        self,
+        source_table: str,
+        target_table: str,
+        target_columns: List[str],
+        select_exprs: List[str],
+        params: Union[list, tuple] = None,
+        batch_size: int = 1000
+    ) -> int:
+        """
+        分批搬移数据：将源表中最早的一批行写入目标表，并在同一事务内从源表删除
+
+        每批独立提交，中途中断后重新执行不会产生重复数据。
+
+        :param source_table: 源表名称
+        :param target_table: 目标表名称
+        :param target_columns: 目标表的列
+        :param select_exprs: 与 target_columns 一一对应的源表查询表达式
+        :param params: select_exprs 中占位符的参数
+        :param batch_size: 每批行数
+        :return: 本批搬移的行数（0表示源表已空）
+        """
+        self.cursor.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {source_table} ORDER BY rowid LIMIT ?)",
+            (batch_size,)
+        )
+        last_rowid = self.cursor.fetchone()[0]
+        if last_rowid is None:
+            return 0
+        try:
+            self.cursor.execute(
+                f"INSERT INTO {target_table} ({', '.join(target_columns)}) "
+                f"SELECT {', '.join(select_exprs)} FROM {source_table} WHERE rowid <= ? ORDER BY rowid",
+                [*(params or ()), last_rowid]
+            )
+            moved = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM {source_table} WHERE rowid <= ?", (last_rowid,))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        logger.debug(f"Moved {moved} rows from {source_table} to {target_table}")
+        return moved
+
+    @_synchronized
     def insert(
         self,
         table_name: str,
@@ -83,6 +254,60 @@ class SQLiteManager:
         logger.debug(f"Inserted into {table_name}: {data}")
         return self.cursor.lastrowid
 
+    @_synchronized
+    def insert_or_ignore(
+        self,
+        table_name: str,
+        data: Dict[str, Any],
+        conflict_columns: List[str]
+    ) -> int:
+        """
+        插入（冲突时忽略，原子操作）
+
+        :param table_name: 表名称
+        :param data: 要插入的数据字典 {列名: 值}
+        :param conflict_columns: 冲突判断列（用于ON CONFLICT子句）
+        :return: 受影响的行数（已存在时为0）
+        """
+        columns = list(data.keys())
+        values = list(data.values())
+        placeholders = ", ".join(["?"] * len(values))
+
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+        )
+        self.cursor.execute(query, values)
+        self.conn.commit()
+        logger.debug(f"Inserted (ignore on conflict) into {table_name}: {data}")
+        return self.cursor.rowcount
+
+    @_synchronized
+    def insert_many(self, rows: List[Tuple[str, Tuple[str, ...], tuple]]) -> int:
+        """
+        批量插入（单个事务，一次提交）
+
+        相同表和列的连续行合并为一次 executemany。
+
+        :param rows: (表名, 列名元组, 值元组) 列表
+        :return: 插入的行数
+        """
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[tuple]] = {}
+        for table_name, columns, values in rows:
+            groups.setdefault((table_name, columns), []).append(values)
+        try:
+            for (table_name, columns), values_list in groups.items():
+                placeholders = ", ".join(["?"] * len(columns))
+                query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+                self.cursor.executemany(query, values_list)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        logger.debug(f"Batch inserted {len(rows)} rows")
+        return len(rows)
+
+    @_synchronized
     def upsert(
         self,
         table_name: str,
@@ -116,6 +341,7 @@ class SQLiteManager:
         logger.debug(f"Upserted into {table_name}: {data}")
         return self.cursor.rowcount
 
+    @_synchronized
     def update(
         self,
         table_name: str,
@@ -147,16 +373,19 @@ class SQLiteManager:
         logger.debug(f"Updated {table_name} where {where}: {data}")
         return self.cursor.rowcount
     
+    @_synchronized
     def delete(
         self,
         table_name: str,
         where: str = None,  # 改为可选参数
+        params: Union[list, tuple] = None
     )-> int:
         """
         通用删除方法
 
         :param table_name: 表名称
-        :param where: WHERE条件语句（可选，不传时删除整个表的数据）
+        :param where: WHERE条件语句（可选，不传时删除整个表的数据，使用?作为占位符）
+        :param params: WHERE条件参数
         :return: 受影响的行数
         """
         # 构建基础查询语句
@@ -165,11 +394,12 @@ class SQLiteManager:
         if where:
             query += f" WHERE {where}"
         
-        self.cursor.execute(query)
+        self.cursor.execute(query, params or ())
         self.conn.commit()
         logger.debug(f"Deleted from {table_name}" + (f" where {where}" if where else " (all rows)"))
         return self.cursor.rowcount
 
+    @_synchronized
     def query(
         self,
         table_name: str,
@@ -214,6 +444,24 @@ class SQLiteManager:
             column_names = [desc[0] for desc in self.cursor.description]
             return [dict(zip(column_names, row)) for row in results]
 
+    @_synchronized
+    def query_raw(self, sql: str, params: Union[list, tuple] = None, dump: bool = False) -> List:
+        """
+        执行原始只读SQL语句
+
+        :param sql: SELECT语句（使用?作为占位符）
+        :param params: 参数列表
+        :param dump: 是否转换为字典列表
+        :return: 结果列表
+        """
+        self.cursor.execute(sql, params or ())
+        results = self.cursor.fetchall()
+        if not dump:
+            return results
+        column_names = [desc[0] for desc in self.cursor.description]
+        return [dict(zip(column_names, row)) for row in results]
+
+    @_synchronized
     def execute_raw(self, sql: str, params: Union[list, tuple] = None) -> Any:
         """
         执行原始SQL语句
@@ -226,6 +474,7 @@ class SQLiteManager:
         self.conn.commit()
         return self.cursor
 
+    @_synchronized
     def check_table_exists(self, table_name: str) -> bool:
         """
         检查表是否存在
@@ -233,16 +482,177 @@ class SQLiteManager:
         :param table_name: 表名称
         :return: 表是否存在
         """
-        query = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'"
-        self.cursor.execute(query)
+        table_name = self._normalize_table_name(table_name)
+        if table_name in self._known_tables:
+            return True
+        query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?"
+        self.cursor.execute(query, (table_name,))
         result = self.cursor.fetchone()
+        if result is not None:
+            self._known_tables.add(table_name)
         return result is not None
 
     def close(self):
-        """关闭数据库连接"""
-        self.conn.close()
+        """关闭数据库连接（先等待数据库线程中的任务执行完毕，并写入延迟队列中的剩余数据）"""
+        self._executor.shutdown(wait=True)
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        rows, self._pending_rows = self._pending_rows, []
+        if rows:
+            self.insert_many(rows)
+        with self._lock:
+            self.conn.close()
         logger.info("Database connection closed")
 
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在专用数据库线程中执行同步方法
+
+        :param func: 要执行的同步方法
+        :return: 方法返回值
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def async_insert_deferred(self, table_name: str, data: Dict[str, Any]) -> None:
+        """
+        延迟插入（写后提交）
+
+        数据先进入内存队列，攒够 db_write_batch_size 行或等待
+        db_write_flush_interval_ms 毫秒后，在一个事务中批量写入。
+        异步查询前会先提交队列，保证读到自己写入的数据。
+
+        :param table_name: 表名称
+        :param data: 要插入的数据字典 {列名: 值}
+        """
+        self._pending_rows.append((table_name, tuple(data.keys()), tuple(data.values())))
+        if len(self._pending_rows) >= config.db_write_batch_size:
+            await self.async_flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(config.db_write_flush_interval_ms / 1000, self._start_flush_task)
+
+    def _start_flush_task(self) -> None:
+        """定时器回调：创建提交任务并保留引用直到完成"""
+        task = asyncio.get_running_loop().create_task(self.async_flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _on_flush_done(self, future: asyncio.Future, rows: List[Tuple[str, Tuple[str, ...], tuple]]) -> None:
+        """批量写入结束：失败时将数据放回队列头部，等待下次提交重试"""
+        if future.cancelled():
+            exc: Optional[BaseException] = asyncio.CancelledError()
+        else:
+            exc = future.exception()
+        if exc is None:
+            return
+        self._pending_rows[:0] = rows
+        logger.error(f"批量写入失败，{len(rows)} 行数据已放回队列等待重试: {exc!r}")
+
+    async def async_flush(self) -> None:
+        """
+        立即提交延迟写入队列
+
+        写入不随调用方取消而中止（调用方可能是被取代的生成或超时的查询），
+        写入失败时数据放回队列，不会丢失其他用户的消息。
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        rows, self._pending_rows = self._pending_rows, []
+        if not rows:
+            return
+        future = asyncio.wrap_future(self._executor.submit(self.insert_many, rows))
+        future.add_done_callback(lambda f: self._on_flush_done(f, rows))
+        try:
+            await asyncio.shield(future)
+        except sqlite3.Error:
+            pass  # 已在 _on_flush_done 中记录并放回队列
+
+    async def async_close(self) -> None:
+        """
+        关闭数据库连接（异步版本，不阻塞事件循环）
+
+        先在事件循环中等待定时提交任务并提交延迟写入队列，
+        再在其他线程中等待数据库线程执行完毕并关闭连接。
+        """
+        if self._flush_tasks:
+            await asyncio.wait(self._flush_tasks)
+        await self.async_flush()
+        await asyncio.to_thread(self.close)
+
+    async def async_create_table(self, table_name: str, columns: List[str], constraints: List[str] = None):
+        """异步创建数据表（参数同 create_table）"""
+        return await self._run(self.create_table, table_name, columns, constraints)
+
+    async def async_insert(self, table_name: str, data: Dict[str, Any]) -> int:
+        """异步插入（参数同 insert）"""
+        return await self._run(self.insert, table_name, data)
+
+    async def async_insert_or_ignore(self, table_name: str, data: Dict[str, Any], conflict_columns: List[str]) -> int:
+        """异步插入，冲突时忽略（参数同 insert_or_ignore）"""
+        return await self._run(self.insert_or_ignore, table_name, data, conflict_columns)
+
+    async def async_upsert(self, table_name: str, data: Dict[str, Any], conflict_columns: List[str]) -> int:
+        """异步更新插入（参数同 upsert）"""
+        return await self._run(self.upsert, table_name, data, conflict_columns)
+
+    async def async_update(
+        self,
+        table_name: str,
+        data: Dict[str, Any],
+        where: str,
+        where_params: Union[list, tuple]
+    ) -> int:
+        """异步更新（参数同 update）"""
+        return await self._run(self.update, table_name, data, where, where_params)
+
+    async def async_delete(self, table_name: str, where: str = None, params: Union[list, tuple] = None) -> int:
+        """异步删除（参数同 delete）"""
+        return await self._run(self.delete, table_name, where, params)
+
+    async def async_query(
+        self,
+        table_name: str,
+        columns: List[str] = None,
+        where: str = None,
+        params: Union[list, tuple] = None,
+        order_by: str = None,
+        limit: int = None,
+        dump: bool = False
+    ) -> List[dict]:
+        """异步查询（参数同 query）"""
+        await self.async_flush()
+        return await self._run(self.query, table_name, columns, where, params, order_by, limit, dump)
+
+    async def async_query_raw(self, sql: str, params: Union[list, tuple] = None, dump: bool = False) -> List:
+        """异步执行原始只读SQL语句（参数同 query_raw）"""
+        await self.async_flush()
+        return await self._run(self.query_raw, sql, params, dump)
+
+    async def async_check_table_exists(self, table_name: str) -> bool:
+        """异步检查表是否存在（参数同 check_table_exists）"""
+        return await self._run(self.check_table_exists, table_name)
+
+    async def async_drop_table(self, table_name: str):
+        """异步删除数据表（参数同 drop_table）"""
+        return await self._run(self.drop_table, table_name)
+
+    async def async_move_rows(
+        self,
+        source_table: str,
+        target_table: str,
+        target_columns: List[str],
+        select_exprs: List[str],
+        params: Union[list, tuple] = None,
+        batch_size: int = 1000
+    ) -> int:
+        """异步分批搬移数据（参数同 move_rows）"""
+        return await self._run(
+            self.move_rows, source_table, target_table, target_columns, select_exprs, params, batch_size
+        )
+
     def __enter__(self):
         return self
 
@@ -1,6 +1,10 @@
-from typing import Any, Dict
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
 
 from .sql_manager import SQLiteManager
+from .conversation_manager import ConversationManager
+from .prompt_manager import PromptManager
 from ..config import config, logger
 
 class UserManager:
@@ -17,9 +21,18 @@ class UserManager:
             # 如果尚未实例化，则初始化新实例
             cls._instance = super(UserManager, cls).__new__(cls)
             cls._current_model = config.default_model
+            # 用户ID -> (过期时间, 配置)，按最近访问顺序排列（LRU）
+            cls._config_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
         return cls._instance
+
+    def _cache_config(self, user_id: str, user_config: Dict) -> None:
+        """写入配置缓存并按LRU淘汰"""
+        self._config_cache[user_id] = (time.monotonic() + config.user_config_cache_ttl, dict(user_config))
+        self._config_cache.move_to_end(user_id)
+        while len(self._config_cache) > config.user_config_cache_size:
+            self._config_cache.popitem(last=False)
     
-    def get_user_config(self, user_id: str) -> Dict:
+    async def get_user_config(self, user_id: str) -> Dict:
         """
         获取用户配置
 
@@ -27,22 +40,26 @@ class UserManager:
         - user_id: 用户ID
 
         返回:
-        - 用户配置字典
+        - 用户配置字典（副本，可自由修改）
         """
-        # 从数据库获取用户配置
-        # 如果用户配置不存在，则创建一个默认配置
-        if not SQLiteManager().query(table_name=config.db_user_config_table_name, where="user_id", params=[user_id], dump=True):
-            SQLiteManager().insert(table_name=config.db_user_config_table_name, data={
-                "user_id": user_id, 
-                "personality": config.personality_default, 
-                "temperature": config.temperature,
-                "max_history_length": config.max_history_length
-                })
+        cached = self._config_cache.get(user_id)
+        if cached is not None and cached[0] > time.monotonic():
+            self._config_cache.move_to_end(user_id)
+            return dict(cached[1])
+
+        # 如果用户配置不存在，则创建一个默认配置（已存在时忽略）
+        await SQLiteManager().async_insert_or_ignore(table_name=config.db_user_config_table_name, data={
+            "user_id": user_id, 
+            "personality": config.personality_default, 
+            "temperature": config.temperature,
+            "max_history_length": config.max_history_length
+            }, conflict_columns=["user_id"])
 
-        user_config = SQLiteManager().query(table_name=config.db_user_config_table_name, where="user_id", params=[user_id], dump=True)
-        return user_config[0]
+        user_config = await SQLiteManager().async_query(table_name=config.db_user_config_table_name, where="user_id", params=[user_id], dump=True)
+        self._cache_config(user_id, user_config[0])
+        return dict(user_config[0])
 
-    def set_user_config(self, user_id: str, user_config: Dict) -> None:
+    async def set_user_config(self, user_id: str, user_config: Dict) -> None:
         """
         设置用户配置
 
@@ -51,15 +68,29 @@ class UserManager:
         - config: 用户配置字典
         """
         # 更新数据库中的用户配置
-        SQLiteManager().update(table_name=config.db_user_config_table_name, data=user_config, where="user_id = ?", where_params=[user_id])
+        await SQLiteManager().async_update(table_name=config.db_user_config_table_name, data=user_config, where="user_id = ?", where_params=[user_id])
+
+        if "personality" in user_config:
+            PromptManager().invalidate(user_id)
+
+        # 写穿缓存：合并到已缓存的配置，未缓存时等下次读取再加载
+        cached = self._config_cache.get(user_id)
+        if cached is not None:
+            self._cache_config(user_id, {**cached[1], **user_config})
 
-    def clear_user_conversation(self, user_id: str) -> None:
+    async def clear_user_conversation(self, user_id: str) -> None:
         """
         清空用户对话历史
 
         参数:
         - user_id: 用户ID
         """
-        conversation_table_name = f'"{user_id}_conversations"'
-        # 清空数据库中的用户对话历史
-        SQLiteManager().delete(table_name=conversation_table_name)
\ No newline at end of file
+        # 清空数据库中的用户对话历史（先提交延迟写入队列，避免队列中的旧消息在清空后写入）
+        await SQLiteManager().async_flush()
+        await SQLiteManager().async_delete(
+            table_name=config.db_conversations_table_name,
+            where="user_id = ?",
+            params=[user_id]
+        )
+        ConversationManager().clear_conversation(user_id)
+        PromptManager().invalidate(user_id)
\ No newline at end of file
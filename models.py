@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-from typing import List
+from typing import List, Union
 import json
 
 class ConversationHistory(BaseModel):
@@ -73,7 +73,85 @@ class ConversationHistory(BaseModel):
         self.is_recalled = bool(db_dict["is_recalled"])
         self.is_ai = bool(db_dict["is_ai"])
 
-        
+
+
+class ConversationRecord:
+    """
+    从数据库读取的对话记录（只读快速路径）
+
+    数据写入前已经由 ConversationHistory 完整校验，读取时不再重复校验，
+    也不创建 pydantic 模型；对外接口与 ConversationHistory 保持一致。
+    """
+    __slots__ = ("user_id", "timestamp", "message_content", "is_recalled", "is_ai")
+
+    def __init__(self, user_id: str, timestamp: int, message_content: str, is_recalled: int, is_ai: int):
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.message_content = message_content
+        self.is_recalled = bool(is_recalled)
+        self.is_ai = bool(is_ai)
+
+    def to_dict(self) -> dict:
+        """转换为普通字典（与 ConversationHistory.to_dict 一致）"""
+        return {
+            "user_id": self.user_id,
+            "timestamp": self.timestamp,
+            "message_content": self.message_content,
+            "is_recalled": self.is_recalled,
+            "is_ai": self.is_ai
+        }
+
+    to_conversation = ConversationHistory.to_conversation
+
+    def to_db_dict(self) -> dict:
+        """转换为数据库存储格式"""
+        export_dict = self.to_dict()
+        export_dict["is_recalled"] = int(self.is_recalled)
+        export_dict["is_ai"] = int(self.is_ai)
+        return export_dict
+
+    def __repr__(self) -> str:
+        return (
+            f"ConversationRecord(user_id={self.user_id!r}, timestamp={self.timestamp!r}, "
+            f"message_content={self.message_content!r}, is_recalled={self.is_recalled!r}, is_ai={self.is_ai!r})"
+        )
+
+
+# 对话历史条目：新写入的消息为 ConversationHistory，从数据库读取的为 ConversationRecord
+HistoryEntry = Union[ConversationHistory, ConversationRecord]
+
+
+def benchmark_row_loading(rows: int = 10000, repeat: int = 5) -> None:
+    """对比带校验构造与快速路径构造 rows 条历史记录的耗时"""
+    import timeit
+
+    db_rows = [("u123", 1695100000 + i, f"第{i}条消息内容", 0, i % 2) for i in range(rows)]
+
+    def validated():
+        return [ConversationHistory(
+            user_id=user_id,
+            timestamp=timestamp,
+            message_content=message_content,
+            is_recalled=is_recalled,
+            is_ai=is_ai
+            ) for user_id, timestamp, message_content, is_recalled, is_ai in db_rows]
+
+    def constructed():
+        return [ConversationHistory.model_construct(
+            user_id=user_id,
+            timestamp=timestamp,
+            message_content=message_content,
+            is_recalled=bool(is_recalled),
+            is_ai=bool(is_ai)
+            ) for user_id, timestamp, message_content, is_recalled, is_ai in db_rows]
+
+    def records():
+        return [ConversationRecord(*row) for row in db_rows]
+
+    for name, func in (("校验构造", validated), ("model_construct", constructed), ("ConversationRecord", records)):
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"{name}: {rows} 条耗时 {best * 1000:.2f} ms")
+
 
 # 使用示例
 if __name__ == "__main__":
@@ -95,4 +173,11 @@ if __name__ == "__main__":
         "is_recalled": True,
         "is_ai": False
     }
-    print(msg1.to_dict())
\ No newline at end of file
+    print(msg1.to_dict())
+
+    # 从数据库行快速构造
+    msg2 = ConversationRecord(*db_data.values())
+    print(msg2.to_conversation())
+
+    # 行构造耗时对比
+    benchmark_row_loading()
@@ -1,8 +1,136 @@
+import asyncio
+
+from nonebot import get_driver
+from nonebot.drivers import URL, ASGIMixin, HTTPServerSetup, Request, Response
+
 from ..managers.sql_manager import SQLiteManager
+from ..managers.connection_manager import ConnectionManager
 from ..managers.conversation_manager import ConversationManager
 from ..managers.model_manager import ModelManager
-from ..config import config
+from ..service import bus
+from ..service.metrics import configure as configure_metrics, metrics, write_text
+from ..config import config, logger
 
 # 初始化数据库
-SQLiteManager().create_table(config.db_user_config_table_name, config.db_user_config_table_columns)
+SQLiteManager().ensure_table(config.db_user_config_table_name, config.db_user_config_table_columns)
+# 旧版数据库的用户配置表可能缺少后来新增的列
+SQLiteManager().ensure_columns(config.db_user_config_table_name, config.db_user_config_table_columns[1:])
+SQLiteManager().ensure_table(config.db_conversations_table_name, config.db_user_conversations_table_columns)
+SQLiteManager().create_index(
+    f"idx_{config.db_conversations_table_name}_user_time_covering",
+    config.db_conversations_table_name,
+    config.db_conversations_table_index_columns
+)
+# 早期版本只索引 (user_id, timestamp)，已被上面的覆盖索引取代
+SQLiteManager().drop_index(f"idx_{config.db_conversations_table_name}_user_time")
+
+# 后台事件处理器队列
+bus.configure(
+    workers=config.background_workers,
+    queue_size=config.background_queue_size,
+    overflow=config.background_overflow,
+    spill_size=config.background_spill_size
+)
+
+# 耗时统计：各处理阶段与模型调用在业务代码中记录，事件处理器的耗时通过总线的观察者记录
+configure_metrics(enabled=config.metrics_enabled, window=config.metrics_window)
+
+
+def _observe_handler(event, handler, seconds: float) -> None:
+    metrics.observe(
+        "handler", seconds,
+        event=type(event).__name__,
+        handler=getattr(handler, "__name__", repr(handler))
+    )
+
+
+if config.metrics_enabled:
+    bus.set_handler_observer(_observe_handler)
+
+
+async def _metrics_endpoint(request: Request) -> Response:
+    """以 Prometheus 文本格式返回指标"""
+    return Response(
+        200,
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        content=metrics.to_prometheus()
+    )
+
+
+if config.metrics_enabled and config.metrics_http_route:
+    driver = get_driver()
+    if isinstance(driver, ASGIMixin):
+        driver.setup_http_server(
+            HTTPServerSetup(URL(config.metrics_http_route), "GET", "warmai_metrics", _metrics_endpoint)
+        )
+    else:
+        logger.warning("当前驱动器不支持 HTTP 服务，无法提供指标路径 metrics_http_route")
+
+# 连接保温后台任务
+_keep_warm_task = None
+# 指标文件定期写入任务
+_metrics_export_task = None
+
+
+@get_driver().on_startup
+async def warmup_providers():
+    """启动时预热服务商连接，并按配置启动空闲保温任务"""
+    global _keep_warm_task
+    if config.provider_warmup:
+        await ModelManager().warmup_providers()
+    if config.provider_keep_warm_interval > 0:
+        _keep_warm_task = asyncio.create_task(ModelManager().keep_warm())
+
+
+async def _export_metrics_periodically():
+    """定期将指标写入 metrics_export_path（注册表非线程安全，指标文本在事件循环中生成，仅写文件放到线程中）"""
+    while True:
+        await asyncio.sleep(config.metrics_export_interval)
+        try:
+            await asyncio.to_thread(write_text, config.metrics_export_path, metrics.to_prometheus())
+        except OSError as e:
+            logger.warning(f"写入指标文件失败: {str(e)}")
+
+
+@get_driver().on_startup
+async def start_metrics_export():
+    """按配置启动指标文件的定期写入任务"""
+    global _metrics_export_task
+    if config.metrics_enabled and config.metrics_export_path:
+        _metrics_export_task = asyncio.create_task(_export_metrics_periodically())
+
+
+@get_driver().on_shutdown
+async def close_database():
+    """关闭时等待数据库线程处理完剩余操作并关闭连接"""
+    await SQLiteManager().async_close()
+
+
+@get_driver().on_shutdown
+async def close_connections():
+    """关闭时释放所有服务商连接池"""
+    if _keep_warm_task is not None:
+        _keep_warm_task.cancel()
+    await ConnectionManager().close()
+
+
+
+@get_driver().on_shutdown
+async def stop_metrics_export():
+    """关闭时停止定期写入任务，并写入最后一次指标"""
+    if _metrics_export_task is None:
+        return
+    _metrics_export_task.cancel()
+    try:
+        await asyncio.to_thread(write_text, config.metrics_export_path, metrics.to_prometheus())
+    except OSError as e:
+        logger.warning(f"写入指标文件失败: {str(e)}")
+
 
+# 关闭钩子按注册的相反顺序执行：最后注册的最先执行，确保后台任务在数据库与连接关闭前执行完毕
+@get_driver().on_shutdown
+async def drain_background_handlers():
+    """关闭时等待后台事件处理器执行完毕"""
+    dropped = await bus.drain(config.background_drain_timeout)
+    if dropped:
+        logger.warning(f"关闭时仍有 {dropped} 个后台任务未执行")
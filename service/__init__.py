@@ -3,11 +3,27 @@ service 模块
 
 功能：
 - 提供消息处理的核心逻辑
+- 提供限流、熔断、请求时限、公平调度、指标统计等通用基础设施
 '''
 
 from .bus import Event
+from .breaker import CircuitBreaker
+from .deadline import Deadline, current_deadline
+from .limiter import AdmissionController, ProviderBusyError, TokenBucket
+from .metrics import MetricsRegistry
+from .scheduler import FairScheduler
 
-__all__ = ["Event"]
+__all__ = [
+    "Event",
+    "CircuitBreaker",
+    "Deadline",
+    "current_deadline",
+    "AdmissionController",
+    "ProviderBusyError",
+    "TokenBucket",
+    "FairScheduler",
+    "MetricsRegistry"
+]
 
 __version__ = "0.1.0"
 
@@ -0,0 +1,148 @@
+"""
+熔断模块
+功能：
+- 按最近请求的错误率和慢请求比例判断服务是否健康
+- 服务不健康时熔断（快速失败），冷却后放行少量探测请求
+
+包含：
+- CircuitBreaker：熔断器
+
+状态：
+- closed：正常放行，持续统计最近 window 次请求
+- open：拒绝所有请求，open_seconds 秒后转为 half_open
+- half_open：最多同时放行 half_open_probes 个探测请求，全部成功则恢复 closed，任一失败则重新 open
+
+维护建议：
+1. 每次 allow() 返回 True 后必须调用 record() 或 abandon() 之一
+2. 仅在事件循环中使用（非线程安全）
+"""
+
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+
+class CircuitBreaker:
+    """熔断器"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        window: int = 20,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 30,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30,
+        half_open_probes: int = 1
+    ):
+        self.enabled = enabled  # 关闭时只统计、不熔断
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        # 最近请求的结果：(是否成功, 是否为慢请求)
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probes_passed = 0
+
+    @property
+    def state(self) -> str:
+        """当前状态（open 冷却结束后自动转为 half_open）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probes_passed = 0
+        return self._state
+
+    @property
+    def calls(self) -> int:
+        """最近统计的请求数"""
+        return len(self._calls)
+
+    @property
+    def error_rate(self) -> float:
+        """最近请求的错误率"""
+        if not self._calls:
+            return 0.0
+        return sum(1 for ok, _ in self._calls if not ok) / len(self._calls)
+
+    @property
+    def slow_call_rate(self) -> float:
+        """最近请求中慢请求的比例"""
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, slow in self._calls if slow) / len(self._calls)
+
+    def allow(self) -> bool:
+        """
+        是否放行一个请求
+
+        返回：
+        - True 表示放行（之后需调用 record 或 abandon），False 表示已熔断
+        """
+        if not self.enabled:
+            return True
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def record(self, ok: bool, seconds: float) -> None:
+        """
+        记录一次请求的结果
+
+        参数：
+        - ok: 请求是否成功
+        - seconds: 请求耗时（秒）
+        """
+        slow = seconds >= self.slow_call_seconds
+        self._calls.append((ok, slow))
+        if not self.enabled:
+            return
+
+        if self._state == self.HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if not ok or slow:
+                self._open()
+                return
+            self._probes_passed += 1
+            if self._probes_passed >= self.half_open_probes:
+                self._state = self.CLOSED
+                self._calls.clear()
+            return
+
+        if self._state == self.CLOSED and len(self._calls) >= self.min_calls and (
+            self.error_rate >= self.error_rate_threshold
+            or self.slow_call_rate >= self.slow_call_rate_threshold
+        ):
+            self._open()
+
+    def abandon(self) -> None:
+        """放弃一个已放行但没有结果的请求（如被取消），归还探测名额"""
+        if self._state == self.HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        """当前状态摘要：{"state", "calls", "error_rate", "slow_call_rate"}"""
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "error_rate": self.error_rate,
+            "slow_call_rate": self.slow_call_rate
+        }
@@ -1,11 +1,17 @@
 import asyncio
+import bisect
 import inspect
+import time
 import contextvars
+import logging
+from collections import deque
 from typing import (
     Any, Awaitable, Callable, ClassVar, Generic, Optional, Type, TypeVar, Union
 )
 
-# 上下文变量用于访问当前事件
+logger = logging.getLogger(__name__)
+
+# 上下文变量用于访问当前分发上下文（可像事件对象一样使用，如 current_event.get().cancel()）
 current_event = contextvars.ContextVar('current_event')
 
 E = TypeVar('E', bound='Event')
@@ -14,35 +20,338 @@ EventHandler = Union[
     Callable[..., Awaitable[Optional[Any]]]
 ]
 
+class DispatchContext(Generic[E]):
+    """
+    单次事件分发的上下文
+
+    每次触发都会创建独立的上下文，同一事件对象（如单例事件）可同时进行任意多次分发，
+    取消状态、返回值与异常互不影响。未定义的属性会转发给事件对象。
+    """
+    __slots__ = ("event", "parent", "is_cancelled", "results", "exception")
+
+    def __init__(self, event: E, parent: Optional["DispatchContext"] = None) -> None:
+        self.event = event
+        self.parent = parent  # 嵌套触发时外层的分发上下文
+        self.is_cancelled = False
+        self.results: list[Any] = []  # 各处理器的返回值（按完成顺序）
+        self.exception: Optional[Exception] = None  # 最近一次处理器抛出的异常
+
+    def cancel(self) -> None:
+        """取消本次分发，后续的处理器将不再执行"""
+        self.is_cancelled = True
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.event, name)
+
+# 处理器的执行方式（注册时确定）
+SYNC = "sync"  # 同步处理器，直接在事件循环中调用
+ASYNC = "async"  # 异步处理器，调用后 await
+THREADED = "threaded"  # 同步处理器，通过 asyncio.to_thread 在线程池中执行
+
+# 处理器在同优先级组内的位置
+SEQUENTIAL, CONCURRENT, BACKGROUND = 0, 1, 2
+
+# 分发计划：按优先级从高到低的各组，每组为 (顺序执行的处理器, 并发执行的处理器, 后台处理器)，处理器为 (函数, 执行方式)
+Step = tuple[Callable[..., Any], str]
+Plan = tuple[tuple[tuple[Step, ...], tuple[Step, ...], tuple[Step, ...]], ...]
+
+
+# 处理器耗时观察者：observer(事件, 处理器, 耗时秒数)，每个处理器执行结束后调用（含异常）
+HandlerObserver = Callable[["Event", Callable[..., Any], float], None]
+_handler_observer: Optional[HandlerObserver] = None
+
+
+def set_handler_observer(observer: Optional[HandlerObserver]) -> None:
+    """设置处理器耗时观察者（如接入指标统计），传入 None 取消；未设置时不计时"""
+    global _handler_observer
+    _handler_observer = observer
+
+
+def _handler_kind(handler: Callable[..., Any], threaded: bool) -> str:
+    """注册时判断处理器的执行方式"""
+    is_async = inspect.iscoroutinefunction(handler) or inspect.iscoroutinefunction(getattr(handler, "__call__", None))
+    if threaded:
+        if is_async:
+            raise TypeError("threaded=True 仅适用于同步处理器")
+        return THREADED
+    return ASYNC if is_async else SYNC
+
+
 class HandlerList(Generic[E]):
-    """带优先级的事件处理器容器"""
+    """
+    带优先级的事件处理器容器
+
+    注册时确定每个处理器的执行方式，并在处理器变化后重新生成不可变的分发计划，
+    分发时只按计划执行，不再排序或逐个检查返回值是否可等待。
+    """
     def __init__(self) -> None:
-        self._handlers: list[tuple[int, Callable[..., Any]]] = []
+        # (-优先级, 注册序号, 处理器, 执行方式, 组内位置)，按执行顺序排列
+        self._handlers: list[tuple[int, int, Callable[..., Any], str, int]] = []
+        self._counter = 0
+        self._plan: Optional[Plan] = None
 
-    def add(self, handler: Callable[..., Any], priority: int = 0) -> None:
-        """添加带优先级的处理器"""
+    def add(
+        self,
+        handler: Callable[..., Any],
+        priority: int = 0,
+        concurrent: bool = False,
+        threaded: bool = False,
+        background: bool = False
+    ) -> None:
+        """添加带优先级的处理器（同优先级按注册顺序执行）"""
         if not callable(handler):
             raise TypeError("Handler must be callable")
-        self._handlers.append((priority, handler))
-        self._handlers.sort(key=lambda x: (-x[0], id(x[1])))  # 稳定排序
+        slot = BACKGROUND if background else CONCURRENT if concurrent else SEQUENTIAL
+        entry = (-priority, self._counter, handler, _handler_kind(handler, threaded), slot)
+        self._counter += 1
+        bisect.insort(self._handlers, entry)  # 注册序号唯一，比较不会涉及处理器本身
+        self._plan = None
 
-    async def invoke(self, *args: Any, **kwargs: Any) -> bool:
-        """执行所有处理器"""
-        event = current_event.get()
-        
-        for _, handler in self._handlers:
-            if event.is_cancelled:
-                return True
+    @property
+    def plan(self) -> Plan:
+        """当前的分发计划（处理器变化后首次使用时重新生成）"""
+        if self._plan is None:
+            tiers: list[tuple[list[Step], list[Step], list[Step]]] = []
+            last_priority: Optional[int] = None
+            for priority, _, handler, kind, slot in self._handlers:
+                if priority != last_priority:
+                    tiers.append(([], [], []))
+                    last_priority = priority
+                tiers[-1][slot].append((handler, kind))
+            self._plan = tuple(tuple(map(tuple, tier)) for tier in tiers)
+        return self._plan
 
-            try:
+    @staticmethod
+    async def _call(context: DispatchContext, step: Step, args: tuple, kwargs: dict) -> None:
+        """执行单个处理器，记录返回值；异常交给事件的 handle_exception，未处理则抛出"""
+        handler, kind = step
+        observer = _handler_observer
+        start = time.perf_counter() if observer is not None else 0.0
+        try:
+            if kind == ASYNC:
+                result = await handler(*args, **kwargs)
+            elif kind == THREADED:
+                result = await asyncio.to_thread(handler, *args, **kwargs)
+            else:
                 result = handler(*args, **kwargs)
-                if inspect.isawaitable(result):
-                    await result
+            context.results.append(result)
+        except Exception as e:
+            context.exception = e
+            if not context.event.handle_exception(e):
+                raise
+        finally:
+            if observer is not None:
+                observer(context.event, handler, time.perf_counter() - start)
+
+    async def _call_sequential(self, context: DispatchContext, steps: tuple[Step, ...], args: tuple, kwargs: dict) -> None:
+        """依次执行处理器，每个处理器执行前检查取消状态"""
+        results = context.results
+        observer = _handler_observer
+        for handler, kind in steps:
+            if context.is_cancelled:
+                return
+            # 与 _call 相同，在此展开以减少每个处理器的协程开销
+            start = time.perf_counter() if observer is not None else 0.0
+            try:
+                if kind == SYNC:
+                    results.append(handler(*args, **kwargs))
+                elif kind == ASYNC:
+                    results.append(await handler(*args, **kwargs))
+                else:
+                    results.append(await asyncio.to_thread(handler, *args, **kwargs))
             except Exception as e:
-                if not event.handle_exception(e):
+                context.exception = e
+                if not context.event.handle_exception(e):
                     raise
+            finally:
+                if observer is not None:
+                    observer(context.event, handler, time.perf_counter() - start)
+
+    async def run(self, context: DispatchContext, args: tuple, kwargs: dict) -> bool:
+        """
+        在指定的分发上下文中按计划执行所有处理器，返回是否被取消
+
+        优先级从高到低逐组执行，每组开始前检查取消状态；
+        组内的后台处理器先提交到后台队列（不等待执行），
+        顺序执行的处理器依次执行，并发处理器与之同时执行（asyncio.gather）。
+        """
+        for sequential, concurrent, detached in self.plan:
+            if context.is_cancelled:
+                return True
+
+            for step in detached:
+                await background.submit(context, step, args, kwargs)
+
+            if not concurrent:
+                await self._call_sequential(context, sequential, args, kwargs)
+                continue
+
+            calls = [self._call(context, step, args, kwargs) for step in concurrent]
+            if sequential:
+                calls.append(self._call_sequential(context, sequential, args, kwargs))
+            # 等待同组处理器全部结束后再抛出第一个未处理的异常，避免遗留仍在运行的处理器
+            for outcome in await asyncio.gather(*calls, return_exceptions=True):
+                if isinstance(outcome, BaseException):
+                    raise outcome
+
+        return context.is_cancelled
+
+    async def invoke(self, *args: Any, **kwargs: Any) -> bool:
+        """执行所有处理器（在当前分发上下文中）"""
+        return await self.run(current_event.get(), args, kwargs)
+
+# 后台队列满时的处理方式
+DROP = "drop"  # 丢弃新任务
+BLOCK = "block"  # 等待队列有空位（分发随之等待，形成背压）
+SPILL = "spill"  # 暂存到溢出缓冲区，队列有空位后依次转入；缓冲区也满时丢弃
+
 
-        return event.is_cancelled
+class BackgroundQueue:
+    """
+    后台处理器队列
+
+    后台处理器（@Event.on(background=True)）在分发时只提交到有界队列，由固定数量的工作协程执行，
+    不占用分发本身的耗时。处理器异常交给事件的 handle_exception，未处理的异常记录日志。
+    工作协程在首次提交时启动，关闭时调用 drain() 等待剩余任务执行完毕。
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 1000, overflow: str = DROP, spill_size: int = 10000):
+        self.workers = workers
+        self.queue_size = queue_size  # 0表示不限制
+        self.overflow = overflow
+        self.spill_size = spill_size  # 溢出缓冲区大小，0表示不限制
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._spill: deque = deque()
+        self._tasks: list[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def pending(self) -> int:
+        """等待执行的任务数（含溢出缓冲区）"""
+        return (self._queue.qsize() if self._queue is not None else 0) + len(self._spill)
+
+    def _ensure_started(self) -> asyncio.Queue:
+        """在当前事件循环中启动工作协程（事件循环变化时重新启动）"""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            # 旧事件循环已结束时，其中未执行的任务无法继续
+            self.dropped += self.pending
+            self._loop = loop
+            self._queue = asyncio.Queue(max(self.queue_size, 0))
+            self._spill.clear()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(max(self.workers, 1))]
+        return self._queue
+
+    async def submit(self, context: DispatchContext, step: Step, args: tuple, kwargs: dict) -> bool:
+        """
+        提交一个后台处理器
+
+        返回：
+        - 是否已接受（队列已满且按 drop 策略或溢出缓冲区已满时返回 False）
+        """
+        queue = self._ensure_started()
+        job = (context, step, args, kwargs)
+        self.submitted += 1
+        if not self._spill and not queue.full():
+            queue.put_nowait(job)
+            return True
+        if self.overflow == BLOCK:
+            await queue.put(job)
+            return True
+        if self.overflow == SPILL and (self.spill_size <= 0 or len(self._spill) < self.spill_size):
+            self._spill.append(job)
+            self.spilled += 1
+            return True
+        self.dropped += 1
+        logger.warning(f"后台队列已满，丢弃处理器 {getattr(step[0], '__name__', step[0])}")
+        return False
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            context, step, args, kwargs = await queue.get()
+            # 队列腾出空位，转入溢出缓冲区中最早的任务
+            while self._spill and not queue.full():
+                queue.put_nowait(self._spill.popleft())
+            token = current_event.set(context)
+            try:
+                await HandlerList._call(context, step, args, kwargs)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(f"后台处理器 {getattr(step[0], '__name__', step[0])} 执行失败")
+            finally:
+                current_event.reset(token)
+                queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None) -> int:
+        """
+        等待已提交的任务执行完毕并停止工作协程
+
+        参数：
+        - timeout: 最长等待时间（秒），None表示一直等待
+
+        返回：
+        - 超时后未执行而被丢弃的任务数
+        """
+        if self._queue is None:
+            return 0
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        remaining = self.pending
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.dropped += remaining
+        self._queue = None
+        self._spill.clear()
+        self._tasks = []
+        return remaining
+
+    def snapshot(self) -> dict:
+        """当前状态摘要：{"pending", "submitted", "completed", "failed", "spilled", "dropped"}"""
+        return {
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "spilled": self.spilled,
+            "dropped": self.dropped
+        }
+
+
+# 所有事件共用的后台队列
+background = BackgroundQueue()
+
+
+def configure(workers: int = 2, queue_size: int = 1000, overflow: str = DROP, spill_size: int = 10000) -> None:
+    """
+    配置后台队列（应在首次分发前调用，工作协程数在下次启动时生效）
+
+    参数：
+    - workers: 工作协程数
+    - queue_size: 队列容量，0表示不限制
+    - overflow: 队列满时的处理方式：drop / block / spill
+    - spill_size: spill 策略下溢出缓冲区的大小，0表示不限制
+    """
+    if overflow not in (DROP, BLOCK, SPILL):
+        raise ValueError(f"未知的后台队列溢出策略: {overflow}")
+    background.workers = workers
+    background.queue_size = queue_size
+    background.overflow = overflow
+    background.spill_size = spill_size
+
+
+async def drain(timeout: Optional[float] = None) -> int:
+    """等待后台队列中的任务执行完毕（关闭时调用），返回被丢弃的任务数"""
+    return await background.drain(timeout)
 
 def priority(p: int) -> Callable[[EventHandler], EventHandler]:
     """优先级装饰器"""
@@ -61,24 +370,56 @@ class EventMeta(type):
 class Event(metaclass=EventMeta):
     """事件基类"""
     handlers: ClassVar[HandlerList]
-    is_cancelled: bool = False
 
     @classmethod
-    def on(cls: Type[E], priority: int = 0) -> Callable[[EventHandler], EventHandler]:
-        """事件注册装饰器工厂"""
+    def on(
+        cls: Type[E],
+        priority: int = 0,
+        concurrent: bool = False,
+        threaded: bool = False,
+        background: bool = False
+    ) -> Callable[[EventHandler], EventHandler]:
+        """
+        事件注册装饰器工厂
+
+        参数：
+        - priority: 优先级，越大越先执行
+        - concurrent: 是否与同优先级的其他处理器并发执行（适合互不依赖的副作用，如发送与落库）
+        - threaded: 同步处理器是否在线程池中执行（适合阻塞的文件或网络操作，不阻塞事件循环）
+        - background: 是否作为后台处理器：分发到该优先级时提交到后台队列，不等待执行完成（适合日志、统计等非必要工作）
+        """
         def decorator(func: EventHandler) -> EventHandler:
-            cls.handlers.add(func, priority)
+            cls.handlers.add(func, priority, concurrent, threaded, background)
             return func
         return decorator
 
-    async def _invoke(self, *args: Any, **kwargs: Any) -> bool:
-        """触发事件的实际实现"""
-        self.is_cancelled = False  # 重置取消状态
-        token = current_event.set(self)
+    def _current_context(self) -> Optional[DispatchContext]:
+        """当前正在进行的、属于本事件的分发上下文（支持嵌套触发）"""
+        context: Optional[DispatchContext] = current_event.get(None)
+        while context is not None and context.event is not self:
+            context = context.parent
+        return context
+
+    @property
+    def is_cancelled(self) -> bool:
+        """当前分发是否已被取消（仅在事件处理过程中有效）"""
+        context = self._current_context()
+        return context is not None and context.is_cancelled
+
+    async def _dispatch(self, *args: Any, **kwargs: Any) -> DispatchContext:
+        """触发事件的实际实现：创建独立的分发上下文并执行所有处理器"""
+        context = DispatchContext(self, current_event.get(None))
+        token = current_event.set(context)
         try:
-            return await self.__class__.handlers.invoke(*args, **kwargs)
+            await self.__class__.handlers.run(context, args, kwargs)
         finally:
             current_event.reset(token)
+        return context
+
+    async def _invoke(self, *args: Any, **kwargs: Any) -> bool:
+        """触发事件，返回是否被取消"""
+        context = await self._dispatch(*args, **kwargs)
+        return context.is_cancelled
 
     def trigger(self, *args: Any, **kwargs: Any) -> None:
         """同步触发入口（仅限非异步环境使用）"""
@@ -94,15 +435,21 @@ class Event(metaclass=EventMeta):
         """异步触发入口"""
         await self._invoke(*args, **kwargs)
 
+    async def async_dispatch(self, *args: Any, **kwargs: Any) -> DispatchContext:
+        """异步触发入口，返回本次分发的上下文（可读取取消状态、各处理器的返回值与异常）"""
+        return await self._dispatch(*args, **kwargs)
+
     def cancel(self) -> None:
         """
         取消事件传播
         
         注意：
-        - 此方法仅在事件处理过程中有效。
+        - 此方法仅在事件处理过程中有效，只取消当前这一次分发。
         - 取消事件后，后续的处理器将不再执行。
         """
-        self.is_cancelled = True
+        context = self._current_context()
+        if context is not None:
+            context.cancel()
 
     def handle_exception(self, exc: Exception) -> bool:
         """异常处理（子类可重写）"""
@@ -145,4 +492,33 @@ if __name__ == "__main__":
     login_event.trigger(user, "10.0.0.1")  # 在同步环境中使用
     
     # 正确的异步入口
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
+
+    # 分发性能基准：测量 async_trigger 在不同处理器数量下的吞吐
+    async def benchmark(handler_counts: tuple[int, ...] = (1, 10, 100), duration: float = 0.5):
+        async def async_noop(n: int):
+            return n
+
+        def sync_noop(n: int):
+            return n
+
+        for kind, handler in (("async", async_noop), ("sync", sync_noop)):
+            for count in handler_counts:
+                event_class = EventMeta(f"Bench{kind}{count}", (Event,), {})
+                for i in range(count):
+                    event_class.on(priority=i % 3)(handler)
+                event = event_class()
+
+                triggers = 0
+                start = time.perf_counter()
+                while time.perf_counter() - start < duration:
+                    for n in range(100):
+                        await event.async_trigger(n)
+                    triggers += 100
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{kind:>5} 处理器 x{count:<3}: {triggers / elapsed:>9.0f} 次/秒，"
+                    f"每次 {elapsed / triggers * 1e6:>7.1f}us，每个处理器 {elapsed / triggers / count * 1e6:.2f}us"
+                )
+
+    asyncio.run(benchmark())
\ No newline at end of file
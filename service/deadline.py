@@ -0,0 +1,55 @@
+"""
+时限模块
+功能：
+- 为一次请求设置总时限，各阶段按剩余时间设置超时
+- 通过上下文变量在调用链中传递当前请求的时限
+
+包含：
+- Deadline：请求时限
+- current_deadline：当前请求的时限（上下文变量）
+
+维护建议：
+1. 时限为0表示不限制，此时 timeout() 返回 None
+2. 在新任务中运行的代码会继承创建任务时的 current_deadline
+"""
+
+import math
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class Deadline:
+    """请求时限（从创建时开始计时）"""
+
+    def __init__(self, seconds: float):
+        self._expires = time.monotonic() + seconds if seconds > 0 else math.inf
+
+    @property
+    def remaining(self) -> float:
+        """剩余秒数（不限制时为无穷大）"""
+        return max(self._expires - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        """是否已超时"""
+        return self.remaining <= 0
+
+    def timeout(self, cap: float = 0) -> Optional[float]:
+        """
+        当前阶段可用的超时时间
+
+        参数：
+        - cap: 该阶段的超时上限，0表示不设上限
+
+        返回：
+        - 剩余时间与上限中较小的一个；都不限制时返回 None（可直接传给 asyncio.wait_for）
+        """
+        remaining = self.remaining
+        if cap > 0:
+            remaining = min(remaining, cap)
+        return None if remaining == math.inf else remaining
+
+
+# 当前请求的时限，供无法修改调用参数的下层代码（如模型处理器）读取
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
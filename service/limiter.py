@@ -0,0 +1,173 @@
+"""
+限流模块
+功能：
+- 令牌桶限速（每分钟请求数 / 每分钟token数）
+- 并发数限制与有界排队
+
+包含：
+- TokenBucket：令牌桶
+- AdmissionController：准入控制器
+- ProviderBusyError：排队已满或等待超过排队上限时抛出
+
+维护建议：
+1. 限制值为0表示不限制
+2. 仅在事件循环中使用（非线程安全）
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class ProviderBusyError(Exception):
+    """服务商繁忙：排队已满或等待超时"""
+
+
+class TokenBucket:
+    """令牌桶：容量为 capacity，每秒补充 rate 个令牌"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        获取 amount 个令牌还需等待的秒数（0表示当前即可获取）
+
+        超过容量的请求按容量计算，避免永远无法获取。
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """扣除令牌（调用前应确认 wait_time 为0）"""
+        self._tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    """
+    准入控制器
+
+    同时限制在途请求数、每分钟请求数和每分钟token数；
+    超出限制的请求排队等待，排队已满时立即拒绝，等待超时后拒绝；
+    排队时间同时受请求剩余时限约束。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 0,
+        rpm: int = 0,
+        tpm: int = 0,
+        queue_size: int = 100,
+        queue_timeout: float = 10
+    ):
+        self._semaphore: Optional[asyncio.Semaphore] = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._request_bucket = TokenBucket(rpm, rpm / 60) if rpm > 0 else None
+        self._token_bucket = TokenBucket(tpm, tpm / 60) if tpm > 0 else None
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+
+    def _can_enter(self) -> bool:
+        """当前是否无需排队即可进入"""
+        if self.waiting:
+            return False
+        if self._semaphore is not None and self._semaphore.locked():
+            return False
+        return not any(
+            bucket is not None and bucket.wait_time(1) > 0
+            for bucket in (self._request_bucket, self._token_bucket)
+        )
+
+    def _bucket_wait(self, tokens: int) -> float:
+        """同时满足两个令牌桶还需等待的秒数"""
+        wait = 0.0
+        if self._request_bucket is not None:
+            wait = max(wait, self._request_bucket.wait_time(1))
+        if self._token_bucket is not None:
+            wait = max(wait, self._token_bucket.wait_time(tokens))
+        return wait
+
+    async def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> None:
+        """
+        申请一个请求名额
+
+        参数：
+        - tokens: 本次请求预计消耗的token数
+        - timeout: 请求剩余的时限（秒），None表示不限制；排队最多等待 queue_timeout 与 timeout 中较小者
+
+        异常：
+        - ProviderBusyError: 排队已满或排队超过 queue_timeout
+        - asyncio.TimeoutError: 排队超过请求剩余的时限
+        """
+        if not self._can_enter() and self.waiting >= self.queue_size:
+            raise ProviderBusyError("排队已满")
+
+        # 请求时限先于排队上限到期时按请求超时处理，而不是按服务商繁忙处理
+        by_deadline = timeout is not None and timeout < self.queue_timeout
+        wait_limit = timeout if by_deadline else self.queue_timeout
+        deadline = time.monotonic() + wait_limit
+        self.waiting += 1
+        try:
+            if self._semaphore is not None:
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=wait_limit)
+                except asyncio.TimeoutError:
+                    if by_deadline:
+                        raise
+                    raise ProviderBusyError("等待并发名额超时") from None
+            try:
+                while True:
+                    wait = self._bucket_wait(tokens)
+                    if wait <= 0:
+                        break
+                    if time.monotonic() + wait > deadline:
+                        if by_deadline:
+                            raise asyncio.TimeoutError()
+                        raise ProviderBusyError("等待速率配额超时")
+                    await asyncio.sleep(wait)
+            except BaseException:
+                if self._semaphore is not None:
+                    self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        if self._request_bucket is not None:
+            self._request_bucket.consume(1)
+        if self._token_bucket is not None:
+            self._token_bucket.consume(tokens)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        """归还请求名额"""
+        self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self, tokens: int = 0, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        在准入控制下执行一次请求（参数与异常同 acquire）
+
+        用法：
+        async with controller.admit(tokens, deadline.timeout()):
+            ...
+        """
+        await self.acquire(tokens, timeout)
+        try:
+            yield
+        finally:
+            self.release()
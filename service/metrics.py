@@ -0,0 +1,214 @@
+"""
+指标模块
+功能：
+- 进程内的耗时直方图（按名称与标签区分）
+- 计算最近样本的分位数
+- 导出 Prometheus 文本格式
+
+包含：
+- Histogram：耗时直方图
+- MetricsRegistry：指标注册表
+- metrics：全局指标注册表
+- configure：配置全局指标注册表
+- write_text：原子写入导出的指标文本
+
+维护建议：
+1. 耗时单位统一为秒
+2. 标签取值应为有限集合（如阶段名、模型名），不要使用用户ID等无限取值
+3. 仅在事件循环中使用（非线程安全）
+"""
+
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# Prometheus 直方图的默认分桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 标签：按键排序的 (键, 值) 元组
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _pick(ordered: List[float], percentile: float) -> Optional[float]:
+    """从已排序的样本中取分位数（0~100）"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))]
+
+
+class Histogram:
+    """
+    耗时直方图
+
+    累计总次数、总耗时与各分桶计数（用于 Prometheus 导出），
+    并保留最近 window 个样本用于计算分位数。
+    """
+
+    def __init__(self, window: int = 1000, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        """记录一次耗时（秒）"""
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """最近样本的分位数（0~100），没有样本时返回 None"""
+        return _pick(sorted(self.samples), percentile)
+
+    def snapshot(self) -> dict:
+        """当前状态摘要：{"count", "avg", "p50", "p95", "p99", "max"}，分位数基于最近的样本"""
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": _pick(ordered, 50),
+            "p95": _pick(ordered, 95),
+            "p99": _pick(ordered, 99),
+            "max": self.max if self.count else None
+        }
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    用法：
+    with metrics.timer("stage", stage="build_prompt"):
+        ...
+    metrics.observe("provider", 1.2, model="doubao", outcome="ok")
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 1000, prefix: str = "warmai"):
+        self.enabled = enabled  # 关闭时不记录任何指标
+        self.window = window
+        self.prefix = prefix  # 导出 Prometheus 时的指标名前缀
+        # 指标名 -> 标签 -> 直方图
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        """获取（必要时创建）指定名称与标签的直方图"""
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.window)
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """记录一次耗时（秒）"""
+        if self.enabled:
+            self.histogram(name, **labels).observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """统计代码块的耗时（异常退出时同样记录）"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, List[dict]]:
+        """
+        获取所有指标的状态摘要
+
+        返回：
+        - {指标名: [{"labels": {...}, "count", "avg", "p50", "p95", "p99", "max"}, ...]}，耗时单位为秒
+        """
+        return {
+            name: [{"labels": dict(labels), **histogram.snapshot()} for labels, histogram in series.items()]
+            for name, series in self._histograms.items()
+        }
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        self._histograms.clear()
+
+    def to_prometheus(self) -> str:
+        """导出 Prometheus 文本格式（每个指标导出为 <prefix>_<name>_seconds 直方图）"""
+        lines = []
+        for name, series in self._histograms.items():
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels, le=f'{bound:g}')} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf')} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """将 Prometheus 文本格式的指标写入文件（同步写入；需在其他线程写文件时，先在事件循环中生成文本再调用 write_text）"""
+        write_text(path, self.to_prometheus())
+
+
+def write_text(path: str, text: str) -> None:
+    """写入文本文件（先写临时文件再替换，读取方不会读到写了一半的内容；不访问注册表，可在其他线程中调用）"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    """格式化 Prometheus 标签（转义反斜杠、引号与换行）"""
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
+
+
+def configure(enabled: bool = True, window: int = 1000) -> None:
+    """
+    配置全局指标注册表（应在记录指标前调用）
+
+    参数：
+    - enabled: 是否记录指标
+    - window: 每个直方图保留的最近样本数（用于计算分位数）
+    """
+    metrics.enabled = enabled
+    metrics.window = window
+
+
+if __name__ == "__main__":
+    import random
+
+    for _ in range(1000):
+        metrics.observe("stage", random.expovariate(20), stage="build_prompt")
+        metrics.observe("provider", random.expovariate(1), model="doubao", outcome="ok")
+    for name, series in metrics.snapshot().items():
+        for item in series:
+            print(name, item)
+    print(metrics.to_prometheus())
@@ -0,0 +1,142 @@
+"""
+公平调度模块
+功能：
+- 限制同时进行的请求数
+- 排队的请求按优先级分类，同一优先级内按用户做差额轮询（Deficit Round Robin）
+
+包含：
+- FairScheduler：公平调度器
+
+维护建议：
+1. 并发数为0表示不限制（不排队）
+2. 请求的开销可用估算token数表示，每轮每个用户获得 quantum 的额度
+3. 仅在事件循环中使用（非线程安全）
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+
+class FairScheduler:
+    """
+    公平调度器
+
+    有空闲名额时优先服务高优先级的请求；同一优先级内，每个用户轮流获得 quantum 的额度，
+    额度足够支付队首请求的开销时才放行，因此发送大量或超长请求的用户不会挤占其他用户。
+    """
+
+    def __init__(self, max_concurrency: int = 0, quantum: int = 500):
+        self.max_concurrency = max_concurrency
+        self.quantum = quantum
+        self.in_flight = 0
+        # 优先级 -> 用户 -> 排队的请求 (开销, 等待放行的 future)，用户按轮询顺序排列
+        self._queues: Dict[int, "OrderedDict[str, Deque[Tuple[int, asyncio.Future]]]"] = {}
+        # 用户 -> 剩余额度（仅在该用户有排队请求时保留）
+        self._deficits: Dict[str, int] = {}
+
+    @property
+    def waiting(self) -> int:
+        """排队中的请求数"""
+        return sum(len(queue) for users in self._queues.values() for queue in users.values())
+
+    async def acquire(self, key: str, cost: int = 1, priority: int = 0) -> None:
+        """
+        申请一个请求名额（必要时排队）
+
+        参数：
+        - key: 公平调度的单位（用户ID）
+        - cost: 本次请求的开销（如估算token数）
+        - priority: 优先级，越大越优先
+        """
+        if self.max_concurrency <= 0:
+            return
+        if self.in_flight < self.max_concurrency and not self._queues:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        users = self._queues.setdefault(priority, OrderedDict())
+        users.setdefault(key, deque()).append((max(cost, 1), future))
+        self._deficits.setdefault(key, 0)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已放行但调用方被取消，归还名额
+                self.release()
+            else:
+                self._remove(priority, key, future)
+            raise
+
+    def release(self) -> None:
+        """归还请求名额，并放行排队中的下一个请求"""
+        if self.max_concurrency <= 0:
+            return
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        key: str,
+        cost: int = 1,
+        priority: int = 0,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """
+        在调度下执行一次请求
+
+        参数：
+        - timeout: 排队的最长等待时间（秒），None表示一直等待；超时抛出 asyncio.TimeoutError
+
+        用法：
+        async with scheduler.slot(user_id, cost, priority):
+            ...
+        """
+        await asyncio.wait_for(self.acquire(key, cost, priority), timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _dispatch(self) -> None:
+        """有空闲名额时按优先级与差额轮询放行排队的请求"""
+        while self.in_flight < self.max_concurrency and self._queues:
+            users = self._queues[max(self._queues)]
+            key, queue = next(iter(users.items()))
+            cost, future = queue[0]
+            if self._deficits[key] < cost:
+                # 额度不足：本轮补充额度后轮到下一个用户
+                self._deficits[key] += self.quantum
+                users.move_to_end(key)
+                continue
+            self._deficits[key] -= cost
+            queue.popleft()
+            if not queue:
+                self._drop_user(users, key)
+            if future.cancelled():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _remove(self, priority: int, key: str, future: asyncio.Future) -> None:
+        """移除已取消的排队请求"""
+        users = self._queues.get(priority)
+        if users is None or key not in users:
+            return
+        queue = users[key]
+        for item in queue:
+            if item[1] is future:
+                queue.remove(item)
+                break
+        if not queue:
+            self._drop_user(users, key)
+
+    def _drop_user(self, users: "OrderedDict[str, Deque[Tuple[int, asyncio.Future]]]", key: str) -> None:
+        """用户没有排队请求时移出轮询（额度清零）"""
+        del users[key]
+        self._deficits.pop(key, None)
+        for priority in [p for p, queued in self._queues.items() if not queued]:
+            del self._queues[priority]
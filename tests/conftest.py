@@ -0,0 +1,27 @@
+"""
+测试公共配置
+功能：
+- 使用临时数据库初始化 NoneBot
+- 以 warmai 为包名加载插件（与仓库所在目录名无关）
+  仓库根目录本身是一个包，pytest 收集时会按目录名再导入一次，这里登记为同一模块，避免插件被加载两次
+"""
+
+import importlib.util
+import sys
+import tempfile
+from pathlib import Path
+
+import nonebot
+
+ROOT = Path(__file__).resolve().parents[1]
+
+nonebot.init(db_path=str(Path(tempfile.mkdtemp()) / "data.db"))
+
+if "warmai" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        "warmai", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["warmai"] = module
+    sys.modules.setdefault(ROOT.name, module)
+    spec.loader.exec_module(module)
@@ -0,0 +1,98 @@
+import asyncio
+import random
+
+from warmai.service.bus import Event, background, current_event, drain
+
+
+class StressEvent(Event):
+    pass
+
+
+@StressEvent.on(priority=2)
+async def stress_gate(n: int):
+    await asyncio.sleep(random.random() / 1000)
+    if n % 2:
+        current_event.get().cancel()
+    await asyncio.sleep(random.random() / 1000)
+    return "gate"
+
+
+@StressEvent.on(priority=1)
+async def stress_record(n: int):
+    await asyncio.sleep(random.random() / 1000)
+    return n
+
+
+def test_interleaved_dispatches_keep_separate_contexts():
+    """同一个事件对象同时进行数千次分发、互相交错执行时，取消状态与返回值互不干扰"""
+    event = StressEvent()
+
+    async def main():
+        return await asyncio.gather(*(event.async_dispatch(n) for n in range(5000)))
+
+    for n, context in enumerate(asyncio.run(main())):
+        assert context.is_cancelled == bool(n % 2)
+        assert context.results == (["gate"] if n % 2 else ["gate", n])
+
+
+class ReplyEvent(Event):
+    pass
+
+
+@ReplyEvent.on(concurrent=True)
+async def reply_send(text: str):
+    await asyncio.sleep(0.1)
+    return "sent"
+
+
+@ReplyEvent.on(concurrent=True)
+async def reply_save(text: str):
+    await asyncio.sleep(0.1)
+    return "saved"
+
+
+def test_concurrent_handlers_run_together():
+    """同一优先级内的并发处理器同时执行，分发耗时约等于最慢的一个"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        context = await ReplyEvent().async_dispatch("你好")
+        return context, loop.time() - start
+
+    context, elapsed = asyncio.run(main())
+    assert sorted(context.results) == ["saved", "sent"]
+    assert elapsed < 0.18
+
+
+class NoticeEvent(Event):
+    pass
+
+
+notices = []
+
+
+@NoticeEvent.on()
+async def notice_send(text: str):
+    await asyncio.sleep(0.05)
+
+
+@NoticeEvent.on(background=True)
+async def notice_log(text: str):
+    await asyncio.sleep(0.2)
+    notices.append(text)
+
+
+def test_background_handlers_do_not_delay_dispatch():
+    """后台处理器交由后台队列执行，分发不等待其完成，drain 后全部执行完毕"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await NoticeEvent().async_trigger("后台")
+        elapsed = loop.time() - start
+        assert notices == []
+        await drain()
+        return elapsed
+
+    assert asyncio.run(main()) < 0.15
+    assert notices == ["后台"]
+    assert background.pending == 0
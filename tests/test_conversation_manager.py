@@ -0,0 +1,24 @@
+import asyncio
+
+from warmai.managers.conversation_manager import ConversationManager
+from warmai.managers.sql_manager import SQLiteManager
+
+
+def test_recent_history_query_reads_only_the_covering_index(monkeypatch):
+    """最近历史查询（含 since 条件）应只读覆盖索引，不回表"""
+    queries = []
+
+    async def async_query_raw(sql, params=None, dump=False):
+        queries.append((sql, params))
+        return []
+
+    monkeypatch.setattr(SQLiteManager(), "async_query_raw", async_query_raw)
+    asyncio.run(ConversationManager()._query_recent_history("u1", 20))
+    asyncio.run(ConversationManager()._query_recent_history("u1", 20, since=1000))
+    monkeypatch.undo()
+
+    for sql, params in queries:
+        plan = SQLiteManager().query_raw(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = " ".join(str(row[-1]) for row in plan)
+        assert "USING COVERING INDEX" in details
+        assert "TEMP B-TREE" not in details
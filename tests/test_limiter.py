@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import pytest
+
+from warmai.service.limiter import AdmissionController, ProviderBusyError
+
+
+def test_rate_wait_is_bounded_by_request_timeout():
+    """速率配额的等待超过请求剩余时限时立即按超时失败，而不是等到 queue_timeout"""
+    controller = AdmissionController(rpm=1, queue_timeout=10)
+
+    async def main():
+        await controller.acquire()
+        controller.release()
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.acquire(timeout=2)
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) < 0.5
+    assert controller.waiting == 0
+
+
+def test_concurrency_wait_is_bounded_by_request_timeout():
+    """等待并发名额时，请求时限先到期按超时失败，排队上限先到期按繁忙失败"""
+    controller = AdmissionController(max_concurrency=1, queue_timeout=0.2)
+
+    async def main():
+        await controller.acquire()
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.acquire(timeout=0.05)
+        elapsed = time.monotonic() - start
+        with pytest.raises(ProviderBusyError):
+            await controller.acquire(timeout=5)
+        controller.release()
+        return elapsed
+
+    assert asyncio.run(main()) < 0.15
+    assert controller.in_flight == 0
@@ -0,0 +1,13 @@
+from warmai.service.metrics import MetricsRegistry, write_text
+
+
+def test_prometheus_text_written_to_file(tmp_path):
+    registry = MetricsRegistry()
+    registry.observe("stage", 0.02, stage="build_prompt")
+    path = tmp_path / "metrics" / "warmai.prom"
+
+    write_text(str(path), registry.to_prometheus())
+
+    text = path.read_text(encoding="utf-8")
+    assert 'warmai_stage_seconds_count{stage="build_prompt"} 1' in text
+    assert not (tmp_path / "metrics" / "warmai.prom.tmp").exists()
@@ -0,0 +1,42 @@
+import asyncio
+
+from warmai.config import config
+from warmai.managers.model_manager import ModelManager
+
+
+def test_drop_policy_discards_older_reply_finishing_last(monkeypatch):
+    """drop 策略下，新消息先完成时，之后完成的旧生成不应再发出回复"""
+    manager = ModelManager()
+    monkeypatch.setattr(config, "inflight_policy", "drop")
+
+    async def save_message(user_id, message, time):
+        pass
+
+    async def wait_for_pause(user_id):
+        return True
+
+    first_done = asyncio.Event()
+
+    async def reply(user_id):
+        if not first_done.is_set():
+            first_done.set()
+            await asyncio.sleep(0.1)
+            return "reply-to-first"
+        return "reply-to-second"
+
+    monkeypatch.setattr(manager, "save_message", save_message)
+    monkeypatch.setattr(manager, "wait_for_pause", wait_for_pause)
+    monkeypatch.setattr(manager, "_reply", reply)
+
+    async def main():
+        first = asyncio.create_task(manager.process_message("u1", "first", 1))
+        await first_done.wait()
+        second = await manager.process_message("u1", "second", 2)
+        return await first, second
+
+    first, second = asyncio.run(main())
+
+    assert second == "reply-to-second"
+    assert first is None
+    assert "u1" not in manager._generation_seq
+    assert "u1" not in manager._inflight
@@ -0,0 +1,36 @@
+import random
+
+from warmai.managers.prompt_manager import PromptManager
+from warmai.models import ConversationRecord
+
+
+def _rebuilt(manager, history):
+    """丢弃缓存后整体重建的提示词（去掉含当前时间的系统提示）"""
+    manager.invalidate("fresh")
+    return manager.build("fresh", "性格", history)[1:]
+
+
+def test_incremental_build_with_duplicate_consecutive_messages():
+    """同一秒内重复发送相同内容时，增量构建的结果应与整体重建一致"""
+    manager = PromptManager()
+    manager.invalidate("u1")
+    history = [
+        ConversationRecord("u1", 1000, "在吗", 0, 0),
+        ConversationRecord("u1", 1000, "在吗", 0, 0),
+        ConversationRecord("u1", 1000, "好", 0, 0),
+        ConversationRecord("u1", 1000, "好", 0, 0),
+    ]
+    manager.build("u1", "性格", history[:3])
+    # 新窗口与缓存首尾标识相同，但中间的消息已经不同
+    assert manager.build("u1", "性格", history[1:])[1:] == _rebuilt(manager, history[1:])
+
+
+def test_incremental_build_matches_rebuild_with_repeated_content():
+    manager = PromptManager()
+    manager.invalidate("u2")
+    rng = random.Random(0)
+    history = []
+    for i in range(500):
+        history.append(ConversationRecord("u2", 1000 + i // 4, rng.choice("ab"), 0, rng.random() < 0.3))
+        current = history[-rng.randint(1, 8):]
+        assert manager.build("u2", "性格", current)[1:] == _rebuilt(manager, current)
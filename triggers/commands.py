@@ -5,6 +5,21 @@ from nonebot.params import CommandArg, Arg
 from nonebot.adapters import Message
 
 from ..managers.user_manager import UserManager
+from ..managers.conversation_manager import ConversationManager
+from ..managers.model_manager import AUTO_MODEL, ModelManager
+from ..managers.provider_manager import ProviderManager
+from ..service import bus
+from ..service.metrics import metrics
+from ..config import config
+
+# stats 指令中各指标的标题
+_METRIC_TITLES = {"stage": "处理阶段", "provider": "模型调用", "handler": "事件处理器"}
+
+
+def _format_ms(seconds: float) -> str:
+    """耗时格式化为毫秒（不足10毫秒时保留一位小数）"""
+    ms = seconds * 1000
+    return f"{ms:.1f}ms" if ms < 10 else f"{ms:.0f}ms"
 
 # 注册ai命令处理器，响应格式：/ai <参数1> <参数2> ...
 ai_matcher = on_command("warmai", aliases={"大鸽一号"}, priority=5, block=True)
@@ -22,21 +37,94 @@ async def ai_command_handler(
         """
         处理personality指令
         """
-        user_config = UserManager().get_user_config(user_id)
+        user_config = await UserManager().get_user_config(user_id)
         try:
             # 提取system指令的参数
             personality = args[1]
             new_config = user_config.copy()
             new_config["personality"] = personality
-            UserManager().set_user_config(user_id, new_config)
+            await UserManager().set_user_config(user_id, new_config)
             await ai_matcher.finish(f"已更新system指令参数为：{personality}")
             # 处理system指令的逻辑
         except IndexError:
-            await ai_matcher.finish(f"当前的system指令参数为：{user_config["personality"]}")
+            await ai_matcher.finish(f"当前的system指令参数为：{user_config['personality']}")
+    if args[0] == "model":
+        """
+        处理model指令
+        选择自己使用的模型，auto 表示按实时耗时、错误率与成本自动选择
+        """
+        available = ModelManager().available_models
+        user_config = await UserManager().get_user_config(user_id)
+        try:
+            model = args[1]
+        except IndexError:
+            current = user_config.get("model") or f"默认（{config.default_model}）"
+            await ai_matcher.finish(f"当前使用的模型为：{current}\n可选：{', '.join(available + [AUTO_MODEL])}")
+        if model != AUTO_MODEL and model not in available:
+            await ai_matcher.finish(f"模型 {model} 不存在，可选：{', '.join(available + [AUTO_MODEL])}")
+        await UserManager().set_user_config(user_id, {"model": model})
+        await ai_matcher.finish(f"已切换模型为：{model}")
     if args[0] == "clear":
         """
         处理clear指令
         """
         # 处理clear指令的逻辑
-        UserManager().clear_user_conversation(user_id)
-        await ai_matcher.finish("已清空你的对话历史")
\ No newline at end of file
+        await UserManager().clear_user_conversation(user_id)
+        await ai_matcher.finish("已清空你的对话历史")
+    if args[0] == "migrate":
+        """
+        处理migrate指令（仅管理员）
+        将旧版按用户分表的对话记录迁移到共用对话表
+        """
+        if int(user_id) not in config.admin_user_ids:
+            await ai_matcher.finish("该指令仅限管理员使用")
+        result = await ConversationManager().migrate_legacy_tables()
+        await ai_matcher.finish(f"迁移完成：共 {result['tables']} 张表，{result['rows']} 条记录")
+    if args[0] == "providers":
+        """
+        处理providers指令（仅管理员）
+        查看各模型的熔断状态、错误率、耗时与对冲统计
+        """
+        if int(user_id) not in config.admin_user_ids:
+            await ai_matcher.finish("该指令仅限管理员使用")
+        stats = ProviderManager().stats()
+        if not stats:
+            await ai_matcher.finish("暂无模型调用记录")
+        lines = []
+        for model, model_stats in stats.items():
+            breaker = model_stats["breaker"]
+            latency = (
+                f"p50 {model_stats['p50']:.2f}s / p95 {model_stats['p95']:.2f}s"
+                if model_stats["samples"] else "暂无耗时样本"
+            )
+            lines.append(
+                f"{model}：{breaker['state']}，最近 {breaker['calls']} 次错误率 {breaker['error_rate']:.0%}、"
+                f"慢请求 {breaker['slow_call_rate']:.0%}，{latency}，对冲 {model_stats['hedges']} 次（胜 {model_stats['hedge_wins']} 次）"
+            )
+        await ai_matcher.finish("\n".join(lines))
+    if args[0] == "stats":
+        """
+        处理stats指令（仅管理员）
+        查看各处理阶段、模型调用与事件处理器的耗时分位数（基于最近的样本），以及后台队列状态
+        """
+        if int(user_id) not in config.admin_user_ids:
+            await ai_matcher.finish("该指令仅限管理员使用")
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            await ai_matcher.finish("暂无耗时统计")
+        lines = []
+        for name, series in snapshot.items():
+            lines.append(f"【{_METRIC_TITLES.get(name, name)}】")
+            # 按 p95 从高到低排列，最慢的环节排在最前
+            for item in sorted(series, key=lambda x: x["p95"] or 0, reverse=True):
+                label = " ".join(item["labels"].values())
+                lines.append(
+                    f"{label}：{item['count']} 次，p50 {_format_ms(item['p50'])} / p95 {_format_ms(item['p95'])} / "
+                    f"p99 {_format_ms(item['p99'])} / 最大 {_format_ms(item['max'])}"
+                )
+        background = bus.background.snapshot()
+        lines.append(
+            f"【后台队列】待执行 {background['pending']}，完成 {background['completed']}，"
+            f"失败 {background['failed']}，溢出 {background['spilled']}，丢弃 {background['dropped']}"
+        )
+        await ai_matcher.finish("\n".join(lines))